@@ -19,6 +19,7 @@ CREATE_TABLES = {
     """,
     'WPR': """
         CREATE TABLE IF NOT EXISTS WPR (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
             receiver_name TEXT, position TEXT, date TEXT, crew_members TEXT, wo_number TEXT,
             wo_description TEXT, permit_number TEXT, "plant/rtm_no" TEXT,
             time_of_requesting_permit TEXT, time_of_issuer_starting_swp_preperation TEXT,
@@ -44,6 +45,7 @@ CREATE_TABLES = {
     """,
     'MAP': """
         CREATE TABLE IF NOT EXISTS MAP (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
             sn TEXT, execution_date TEXT, dmr_sn TEXT, "wo_＃" TEXT, maint_activ_type TEXT,
             area TEXT, "functional_loc._/_item_no." TEXT, description TEXT,
             activity_overvise TEXT, "note/highlight" TEXT
@@ -185,7 +187,32 @@ for _ in range(int(TARGET_SIZE * 0.9)):
         fake.sentence()
     ))
 
+# 4. Full-text index over the free-text fields (SQLite counterpart of Postgres migration 008)
+cur.execute("DROP TABLE IF EXISTS search_index")
+cur.execute("""
+    CREATE VIRTUAL TABLE search_index USING fts5(
+        source UNINDEXED, row_id UNINDEXED, body, tokenize = 'porter unicode61'
+    )
+""")
+SEARCH_TEXT = {
+    'maintenance_reports': ['observation', 'recommendation', 'root_cause'],
+    'qc_activities': ['observation_findings'],
+    'daily_safety_patrol': ['observation'],
+}
+for t, cols in SEARCH_TEXT.items():
+    body = " || ' ' || ".join(f"coalesce({c}, '')" for c in cols)
+    cur.execute(f"INSERT INTO search_index (source, row_id, body) SELECT '{t}', id, {body} FROM {t}")
+
 conn.commit()
+
+# Ranked, paginated lookup: best bm25 first, 10 per page
+sample_hits = cur.execute("""
+    SELECT source, row_id, snippet(search_index, 2, '**', '**', '…', 12)
+    FROM search_index WHERE search_index MATCH ?
+    ORDER BY bm25(search_index) LIMIT 10 OFFSET 0
+""", (fake.word(),)).fetchall()
+print("search_index sample hits:", sample_hits[:3])
+
 conn.close()
 
 print(f"Sample DB created and filled: {int(TARGET_SIZE * 0.9)} rows per table. All dummy, NDA-safe!")
@@ -0,0 +1,29 @@
+# scripts/migrations/002_add_row_ids.py
+import os
+import psycopg2
+
+# Same Postgres URL as [database] url in .streamlit/secrets.toml
+DB_URL = os.environ["DATABASE_URL"]
+
+ddl = """
+-- WPR and MAP were imported from Excel without a key. A monotonic id lets the
+-- dashboards refresh by delta (fetch only rows past the last seen id).
+-- Existing rows are numbered in physical order; new rows take the next value.
+ALTER TABLE "WPR" ADD COLUMN IF NOT EXISTS id BIGSERIAL;
+ALTER TABLE "MAP" ADD COLUMN IF NOT EXISTS id BIGSERIAL;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_wpr_id ON "WPR"(id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_map_id ON "MAP"(id);
+"""
+
+with psycopg2.connect(DB_URL) as con:
+    with con.cursor() as cur:
+        cur.execute(ddl)
+
+print("✅ WPR and MAP now have id columns.")
+
+# quick smoke tests
+with psycopg2.connect(DB_URL) as con:
+    with con.cursor() as cur:
+        for table in ("WPR", "MAP"):
+            cur.execute(f'SELECT COUNT(*), MIN(id), MAX(id) FROM "{table}"')
+            print(f"{table} rows/min id/max id:", cur.fetchone())
@@ -0,0 +1,34 @@
+# scripts/migrations/003_wo_permit_overview.py
+import os
+import sys
+import psycopg2
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from utils import OVERVIEW_SELECT, OVERVIEW_TABLE, refresh_wo_permit_overview  # noqa: E402
+
+# Same Postgres URL as [database] url in .streamlit/secrets.toml
+DB_URL = os.environ["DATABASE_URL"]
+
+# Summary table behind the "WO & Permit Overview" page. Column types follow the
+# source tables; insert_wpr/insert_dmr keep it current per WO after this backfill.
+ddl = f"""
+CREATE TABLE IF NOT EXISTS {OVERVIEW_TABLE} AS {OVERVIEW_SELECT}
+WITH NO DATA;
+ALTER TABLE {OVERVIEW_TABLE} ADD COLUMN IF NOT EXISTS id BIGSERIAL PRIMARY KEY;
+CREATE INDEX IF NOT EXISTS idx_overview_wo ON {OVERVIEW_TABLE}(maintenance_wo);
+CREATE INDEX IF NOT EXISTS idx_overview_report_date ON {OVERVIEW_TABLE}(maintenance_report_date);
+CREATE INDEX IF NOT EXISTS idx_overview_area ON {OVERVIEW_TABLE}(maintenance_area);
+"""
+
+with psycopg2.connect(DB_URL) as con:
+    with con.cursor() as cur:
+        cur.execute(ddl)
+    refresh_wo_permit_overview(con)
+
+print(f"✅ {OVERVIEW_TABLE} summary table is ready.")
+
+# quick smoke tests
+with psycopg2.connect(DB_URL) as con:
+    with con.cursor() as cur:
+        cur.execute(f"SELECT COUNT(*), COUNT(DISTINCT maintenance_wo) FROM {OVERVIEW_TABLE}")
+        print("overview rows / distinct WOs:", cur.fetchone())
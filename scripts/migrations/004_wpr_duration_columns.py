@@ -0,0 +1,51 @@
+# scripts/migrations/004_wpr_duration_columns.py
+import os
+import sys
+import pandas as pd
+import psycopg2
+from psycopg2.extras import execute_values
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from utils import WPR_DURATION_COLUMNS, add_wpr_durations  # noqa: E402
+
+# Same Postgres URL as [database] url in .streamlit/secrets.toml
+DB_URL = os.environ["DATABASE_URL"]
+
+# Typed duration columns filled at write time by insert_wpr; requires the id from 002
+ddl = """
+ALTER TABLE "WPR" ADD COLUMN IF NOT EXISTS work_minutes DOUBLE PRECISION;          -- (m-l): finish - start
+ALTER TABLE "WPR" ADD COLUMN IF NOT EXISTS permit_cycle_minutes DOUBLE PRECISION;  -- (n-i): closing - request
+ALTER TABLE "WPR" ADD COLUMN IF NOT EXISTS efficiency_ratio DOUBLE PRECISION;      -- (m-l)/(n-i)
+"""
+
+source_cols = [
+    "id", "work_actual_start_time", "work_finish_time", "time_of_requesting_permit",
+    "swp_closing_time", "(m-l)", "(n-i)", "(m-l)/(n-i)",
+]
+
+with psycopg2.connect(DB_URL) as con:
+    with con.cursor() as cur:
+        cur.execute(ddl)
+        # One-time backfill of existing rows, computed with the same code as the write path
+        quoted = ", ".join(f'"{c}"' for c in source_cols)
+        cur.execute(f'SELECT {quoted} FROM "WPR" WHERE work_minutes IS NULL')
+        wpr = pd.DataFrame(cur.fetchall(), columns=source_cols, dtype=object)
+        wpr = add_wpr_durations(wpr)
+        values = wpr[["id", *WPR_DURATION_COLUMNS]].astype(object)
+        values = values.where(values.notna(), None).itertuples(index=False, name=None)
+        execute_values(cur, """
+            UPDATE "WPR" AS w
+            SET work_minutes = v.work_minutes,
+                permit_cycle_minutes = v.permit_cycle_minutes,
+                efficiency_ratio = v.efficiency_ratio
+            FROM (VALUES %s) AS v(id, work_minutes, permit_cycle_minutes, efficiency_ratio)
+            WHERE w.id = v.id
+        """, list(values), template="(%s, %s::float8, %s::float8, %s::float8)", page_size=1000)
+
+print(f"✅ WPR duration columns ready; backfilled {len(wpr)} rows.")
+
+# quick smoke tests
+with psycopg2.connect(DB_URL) as con:
+    with con.cursor() as cur:
+        cur.execute('SELECT COUNT(work_minutes), AVG(work_minutes), AVG(permit_cycle_minutes), AVG(efficiency_ratio) FROM "WPR"')
+        print("filled rows / avg work min / avg cycle min / avg efficiency:", cur.fetchone())
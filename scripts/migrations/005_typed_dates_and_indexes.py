@@ -0,0 +1,133 @@
+# scripts/migrations/005_typed_dates_and_indexes.py
+import os
+import time
+import psycopg2
+
+# Same Postgres URL as [database] url in .streamlit/secrets.toml
+DB_URL = os.environ["DATABASE_URL"]
+
+# TEXT date columns -> DATE (the app only ever writes 'YYYY-MM-DD')
+DATE_COLUMNS = {
+    "maintenance_reports": ["date", "report_date"],
+    "WPR": ["date"],
+    "qc_activities": ["report_date"],
+    "daily_safety_patrol": ["report_date"],
+    "MAP": ["execution_date"],
+    "wo_permit_overview": ["maintenance_report_date", "permit_date"],  # summary table from 003
+}
+
+# btree indexes on the date range filters, the WO/permit join keys and the filter columns
+INDEXES = {
+    "maintenance_reports": ["report_date", "wo_number", "area", "status", "section"],
+    "WPR": ["date", "wo_number", "permit_number"],
+    "qc_activities": ["report_date", "wo_number", "area", "status", "section"],
+    "daily_safety_patrol": ["report_date", "permit_no", "area", "status", "section"],
+    "MAP": ["execution_date", "wo_＃", "area"],
+}
+
+# Unparseable dates become NULL instead of aborting the ALTER
+try_date = """
+CREATE OR REPLACE FUNCTION pg_temp.try_date(v text) RETURNS date AS $$
+BEGIN
+    RETURN left(btrim(v), 10)::date;
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END $$ LANGUAGE plpgsql IMMUTABLE;
+"""
+
+# Dashboard-shaped queries, run with EXPLAIN ANALYZE before and after the change.
+# Same SQL both times: ISO string bounds compare correctly against TEXT and DATE.
+BENCHMARKS = {
+    "maintenance status counts, 30 days": """
+        SELECT status, COUNT(*) FROM "maintenance_reports"
+        WHERE report_date >= %(start)s AND report_date < %(end)s
+        GROUP BY status
+    """,
+    "QC rows for one area, 30 days": """
+        SELECT * FROM "qc_activities"
+        WHERE report_date >= %(start)s AND report_date < %(end)s AND area = %(area)s
+    """,
+    "MAP daily series, 30 days": """
+        SELECT execution_date, COUNT(*) FROM "MAP"
+        WHERE execution_date >= %(start)s AND execution_date < %(end)s
+        GROUP BY 1 ORDER BY 1
+    """,
+    "overview refresh join, one WO": """
+        SELECT mr.wo_number, wpr.permit_number, qc.id
+        FROM "maintenance_reports" mr
+        LEFT JOIN "WPR" wpr ON mr.wo_number = wpr.wo_number
+        LEFT JOIN "qc_activities" qc ON mr.wo_number = qc.wo_number
+        LEFT JOIN "MAP" m ON mr.wo_number = m."wo_＃"
+        WHERE mr.wo_number = %(wo)s
+    """,
+    "patrol rows for one permit": """
+        SELECT * FROM "daily_safety_patrol" WHERE permit_no = %(permit)s
+    """,
+}
+
+def benchmark(cur, params):
+    """EXPLAIN ANALYZE every benchmark query; returns {name: (plan lines, execution ms)}."""
+    results = {}
+    for name, query in BENCHMARKS.items():
+        cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + query, params)
+        plan = [row[0] for row in cur.fetchall()]
+        ms = next((float(line.split()[2]) for line in plan if line.startswith("Execution Time")), None)
+        results[name] = (plan, ms)
+    return results
+
+def print_plans(label, results):
+    print(f"\n===== {label} =====")
+    for name, (plan, _) in results.items():
+        print(f"\n-- {name}")
+        print("\n".join(plan))
+
+with psycopg2.connect(DB_URL) as con:
+    with con.cursor() as cur:
+        # Benchmark parameters taken from the data itself
+        cur.execute("""SELECT MAX(report_date::text) FROM "maintenance_reports" WHERE report_date::text ~ '^\\d{4}-\\d{2}-\\d{2}'""")
+        end = cur.fetchone()[0] or time.strftime("%Y-%m-%d")
+        cur.execute("SELECT (%s::date - 30)::text, (%s::date + 1)::text", (end[:10], end[:10]))
+        start, end = cur.fetchone()
+        cur.execute('SELECT wo_number FROM "maintenance_reports" WHERE wo_number IS NOT NULL LIMIT 1')
+        wo = (cur.fetchone() or [None])[0]
+        cur.execute('SELECT area FROM "qc_activities" WHERE area IS NOT NULL LIMIT 1')
+        area = (cur.fetchone() or [None])[0]
+        cur.execute('SELECT permit_no FROM "daily_safety_patrol" WHERE permit_no IS NOT NULL LIMIT 1')
+        permit = (cur.fetchone() or [None])[0]
+        params = {"start": start, "end": end, "wo": wo, "area": area, "permit": permit}
+        before = benchmark(cur, params)
+
+        cur.execute(try_date)
+        for table, columns in DATE_COLUMNS.items():
+            for column in columns:
+                cur.execute(f'SELECT COUNT(*) FROM "{table}" WHERE "{column}" IS NOT NULL AND pg_temp.try_date("{column}"::text) IS NULL')
+                lost = cur.fetchone()[0]
+                if lost:
+                    print(f"⚠️ {table}.{column}: {lost} unparseable values will become NULL")
+                cur.execute(f'ALTER TABLE "{table}" ALTER COLUMN "{column}" TYPE DATE USING pg_temp.try_date("{column}"::text)')
+
+        for table, columns in INDEXES.items():
+            for column in columns:
+                name = f"idx_{table.lower()}_{column.replace('＃', 'no')}"
+                cur.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ("{column}")')
+            cur.execute(f'ANALYZE "{table}"')
+
+        after = benchmark(cur, params)
+
+print("✅ Date columns are DATE and filter/join indexes are in place.")
+print_plans("BEFORE (TEXT dates, no indexes)", before)
+print_plans("AFTER (DATE + btree indexes)", after)
+print("\nExecution time (ms)        before      after")
+for name in BENCHMARKS:
+    print(f"{name:<36} {before[name][1] or 0:>9.3f} {after[name][1] or 0:>10.3f}")
+
+# quick smoke tests
+with psycopg2.connect(DB_URL) as con:
+    with con.cursor() as cur:
+        cur.execute("""
+            SELECT table_name, column_name, data_type FROM information_schema.columns
+            WHERE table_schema = 'public' AND data_type = 'date' ORDER BY 1, 2
+        """)
+        print("DATE columns:", cur.fetchall())
+        cur.execute("SELECT tablename, indexname FROM pg_indexes WHERE schemaname = 'public' ORDER BY 1, 2")
+        print("indexes:", cur.fetchall())
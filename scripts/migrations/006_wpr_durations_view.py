@@ -0,0 +1,79 @@
+# scripts/migrations/006_wpr_durations_view.py
+import os
+import psycopg2
+
+# Same Postgres URL as [database] url in .streamlit/secrets.toml
+DB_URL = os.environ["DATABASE_URL"]
+
+# Postgres port of the SQLite vw_wpr_durations from work_order_meta.py, with every
+# permit phase as a native interval. The Permit Dashboard reads this view
+# (utils.WPR_DURATIONS_VIEW). `w.*` is expanded when the view is created, so re-run
+# this script after adding columns to "WPR".
+ddl = r"""
+-- '13;20', '07:00', '07:00:00.000000' -> time; anything else -> NULL
+CREATE OR REPLACE FUNCTION wpr_clock(v text) RETURNS time
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT substring(replace(btrim(v), ';', ':') FROM '^(?:[01]?\d|2[0-3]):[0-5]\d(?::[0-5]\d)?')::time
+$$;
+
+-- b - a, counting a b earlier than a as past midnight. '24 hours', not '1 day':
+-- Postgres keeps the day part apart ('1 day -05:00:00'), which pandas can't parse
+CREATE OR REPLACE FUNCTION wpr_phase(a time, b time) RETURNS interval
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT CASE WHEN b >= a THEN b - a ELSE b - a + interval '24 hours' END
+$$;
+
+DROP VIEW IF EXISTS vw_wpr_durations;
+CREATE VIEW vw_wpr_durations AS
+WITH clocks AS (
+    SELECT w.*,
+           wpr_clock(w.time_of_requesting_permit::text) AS t_request,
+           wpr_clock(w.time_of_issuer_starting_swp_preperation::text) AS t_prep,
+           wpr_clock(w.time_of_permit_issuance::text) AS t_issue,
+           wpr_clock(w.work_actual_start_time::text) AS t_start,
+           wpr_clock(w.work_finish_time::text) AS t_finish,
+           wpr_clock(w.swp_closing_time::text) AS t_close
+    FROM "WPR" w
+),
+phases AS (
+    SELECT c.*,
+           wpr_phase(t_request, t_prep) AS request_to_prep,
+           wpr_phase(t_prep, t_issue) AS prep_to_issuance,
+           wpr_phase(t_issue, t_start) AS issuance_to_start,
+           wpr_phase(t_start, t_finish) AS start_to_finish,
+           wpr_phase(t_finish, t_close) AS finish_to_close,
+           wpr_phase(t_request, t_close) AS request_to_close
+    FROM clocks c
+)
+SELECT p.*,
+       EXTRACT(EPOCH FROM request_to_prep) / 60 AS minutes_request_to_prep,
+       EXTRACT(EPOCH FROM prep_to_issuance) / 60 AS minutes_prep_to_issuance,
+       EXTRACT(EPOCH FROM issuance_to_start) / 60 AS minutes_issuance_to_start,
+       EXTRACT(EPOCH FROM start_to_finish) / 60 AS minutes_exec,
+       EXTRACT(EPOCH FROM finish_to_close) / 60 AS minutes_finish_to_close,
+       EXTRACT(EPOCH FROM request_to_close) / 60 AS minutes_end_to_end,
+       -- Dashboard KPIs; rows without usable clock times fall back to the ingest columns (004)
+       COALESCE(EXTRACT(EPOCH FROM start_to_finish) / 3600, work_minutes / 60) AS work_hours,
+       COALESCE(EXTRACT(EPOCH FROM request_to_close) / 3600, permit_cycle_minutes / 60) AS permit_cycle_hours,
+       round(COALESCE(
+           EXTRACT(EPOCH FROM start_to_finish) / NULLIF(EXTRACT(EPOCH FROM request_to_close), 0),
+           efficiency_ratio
+       )::numeric, 2) AS efficiency
+FROM phases p;
+"""
+
+with psycopg2.connect(DB_URL) as con:
+    with con.cursor() as cur:
+        cur.execute(ddl)
+
+print("✅ vw_wpr_durations view is ready.")
+
+# quick smoke tests
+with psycopg2.connect(DB_URL) as con:
+    with con.cursor() as cur:
+        cur.execute("""
+            SELECT COUNT(*), COUNT(start_to_finish), AVG(request_to_prep), AVG(prep_to_issuance),
+                   AVG(issuance_to_start), AVG(start_to_finish), AVG(finish_to_close), AVG(efficiency)
+            FROM vw_wpr_durations
+        """)
+        print("rows / timed rows / avg phases / avg efficiency:", cur.fetchone())
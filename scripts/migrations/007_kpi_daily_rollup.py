@@ -0,0 +1,44 @@
+# scripts/migrations/007_kpi_daily_rollup.py
+import os
+import sys
+import psycopg2
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from utils import KPI_TABLE, refresh_kpi_daily  # noqa: E402
+
+# Same Postgres URL as [database] url in .streamlit/secrets.toml
+DB_URL = os.environ["DATABASE_URL"]
+
+# Per-day counts behind the trend and breakdown charts. Every insert path keeps it
+# current for the days it wrote; re-run this script to rebuild it from scratch
+# after loading rows out of band (WAVE/SQLite imports, manual SQL).
+ddl = f"""
+CREATE TABLE IF NOT EXISTS {KPI_TABLE} (
+  source_table      TEXT NOT NULL,
+  day               DATE,
+  area              TEXT,
+  section           TEXT,
+  status            TEXT,
+  type              TEXT,
+  row_count         INTEGER NOT NULL,
+  completed         INTEGER NOT NULL,
+  on_progress       INTEGER NOT NULL,
+  failed            INTEGER NOT NULL,
+  efficiency_sum    DOUBLE PRECISION,   -- WPR efficiency_ratio; mean = sum / count
+  efficiency_count  INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_kpi_daily_source_day ON {KPI_TABLE}(source_table, day);
+"""
+
+with psycopg2.connect(DB_URL) as con:
+    with con.cursor() as cur:
+        cur.execute(ddl)
+    refresh_kpi_daily(con)
+
+print(f"✅ {KPI_TABLE} rollup is built.")
+
+# quick smoke tests
+with psycopg2.connect(DB_URL) as con:
+    with con.cursor() as cur:
+        cur.execute(f"SELECT source_table, COUNT(*), SUM(row_count), MIN(day), MAX(day) FROM {KPI_TABLE} GROUP BY 1 ORDER BY 1")
+        print("source / rollup rows / source rows / first day / last day:", cur.fetchall())
@@ -0,0 +1,35 @@
+# scripts/migrations/008_full_text_search.py
+import os
+import sys
+import psycopg2
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from utils import SEARCH_CONFIG, SEARCH_SOURCES, search_document  # noqa: E402
+
+# Same Postgres URL as [database] url in .streamlit/secrets.toml
+DB_URL = os.environ["DATABASE_URL"]
+
+# Expression GIN indexes rather than stored tsvector columns, so `SELECT *` readers
+# never see the vectors. utils.search_records uses the very same expressions.
+ddl = "\n".join(
+    f'CREATE INDEX IF NOT EXISTS idx_{table}_fts ON "{table}" USING GIN (({search_document(table)}));'
+    for table in SEARCH_SOURCES
+)
+
+with psycopg2.connect(DB_URL) as con:
+    with con.cursor() as cur:
+        cur.execute(ddl)
+        for table in SEARCH_SOURCES:
+            cur.execute(f'ANALYZE "{table}"')
+
+print("✅ Full-text indexes are ready:", ", ".join(f"idx_{t}_fts" for t in SEARCH_SOURCES))
+
+# quick smoke tests
+with psycopg2.connect(DB_URL) as con:
+    with con.cursor() as cur:
+        table = "maintenance_reports"
+        cur.execute(
+            f"""EXPLAIN ANALYZE SELECT id FROM "{table}" WHERE ({search_document(table)}) @@ websearch_to_tsquery(%s, %s)""",
+            (SEARCH_CONFIG, "pump seal leak"),
+        )
+        print("\n".join(row[0] for row in cur.fetchall()))
@@ -0,0 +1,33 @@
+# scripts/migrations/009_overview_numeric_durations.py
+import os
+import sys
+import psycopg2
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from utils import OVERVIEW_TABLE, refresh_wo_permit_overview  # noqa: E402
+
+# Same Postgres URL as [database] url in .streamlit/secrets.toml
+DB_URL = os.environ["DATABASE_URL"]
+
+# The overview now copies the typed WPR columns from 004 (hours and ratio) instead of
+# the legacy "(m-l)", "(n-i)" and "(m-l)/(n-i)" text; the rows are rebuilt below.
+ddl = f"""
+ALTER TABLE {OVERVIEW_TABLE} ALTER COLUMN work_duration TYPE DOUBLE PRECISION USING NULL;
+ALTER TABLE {OVERVIEW_TABLE} ALTER COLUMN total_permit_time TYPE DOUBLE PRECISION USING NULL;
+ALTER TABLE {OVERVIEW_TABLE} ALTER COLUMN efficiency TYPE DOUBLE PRECISION USING NULL;
+"""
+
+with psycopg2.connect(DB_URL) as con:
+    with con.cursor() as cur:
+        cur.execute(ddl)
+    refresh_wo_permit_overview(con)
+
+print(f"✅ {OVERVIEW_TABLE} durations are numeric and rebuilt.")
+
+# quick smoke tests
+with psycopg2.connect(DB_URL) as con:
+    with con.cursor() as cur:
+        cur.execute(f"SELECT COUNT(*), COUNT(work_duration), AVG(work_duration), AVG(efficiency) FROM {OVERVIEW_TABLE}")
+        print("rows / rows with work duration / avg hours / avg efficiency:", cur.fetchone())
+        cur.execute('SELECT COUNT(efficiency_ratio), AVG(efficiency_ratio) FROM "WPR"')
+        print("WPR rows with efficiency / avg efficiency:", cur.fetchone())
@@ -1,14 +1,70 @@
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
-from utils import get_connection, get_table, insert_wpr, insert_dmr, time_to_hours, get_wo_permit_overview, format_timedelta_to_h_m
+from utils import get_connection, insert_wpr, insert_dmr, get_wo_permit_overview, get_counts, get_time_series, load_delta_frame, bump_table_versions, get_date_bounds, get_distinct_values, get_wo_permit_rollup, get_wo_permit_detail, count_search_matches, search_records, WPR_DURATIONS_VIEW, HEAVY_TEXT_COLUMNS, delta_store_memory, frame_copy_stats, get_table_page, count_rows, LINKED_TO_PERMIT, permit_links, normalize_times, read_upload, prepare_wpr_upload, prepare_dmr_upload, start_upload_job, upload_job_status, WPR_UPLOAD_COLUMNS, DMR_UPLOAD_COLUMNS, format_timedelta_to_h_m_series
 
 
 import altair as alt
 
 
-from datetime import datetime
-
+import functools
+import re
+import time
+
+
+def show_upload_job(job):
+    """Progress, per-batch throughput and outcome of a background upload job."""
+    total = max(job["rows_total"], 1)
+    st.progress(job["rows_done"] / total, text=f"{job['rows_done']:,} / {job['rows_total']:,} rows written")
+    if job["batches"]:
+        st.dataframe(pd.DataFrame(job["batches"]), hide_index=True, use_container_width=True)
+    if job["status"] == "done":
+        st.success(f"✅ Upload finished in {job['finished'] - job['started']:.1f}s.")
+    elif job["status"] == "failed":
+        st.error(f"❌ Upload failed after {job['rows_done']:,} rows — {job['error']}")
+
+@st.fragment(run_every=1)
+def poll_upload_job(job_id):
+    """Only this fragment reruns while the job writes; the page reruns once when it ends."""
+    job = upload_job_status(job_id)
+    show_upload_job(job)
+    if job["status"] != "running":
+        st.rerun()
+
+def render_bulk_upload():
+    """WO 360 spreadsheet mode: validate a register up front, write it on a background job."""
+    st.caption("Upload the daily permit register and/or DMR rows as xlsx or csv. Headers are the column names of the templates below. Dates must be YYYY-MM-DD or Excel date cells.")
+    c1, c2 = st.columns(2)
+    c1.download_button("WPR template (csv)", ",".join(WPR_UPLOAD_COLUMNS) + "\n", "wpr_template.csv", "text/csv")
+    c2.download_button("DMR template (csv)", ",".join(DMR_UPLOAD_COLUMNS) + "\n", "dmr_template.csv", "text/csv")
+    wpr_file = c1.file_uploader("Permit register (WPR)", type=["xlsx", "csv"])
+    dmr_file = c2.file_uploader("DMR rows", type=["xlsx", "csv"])
+
+    prepared = {}
+    for label, file, prepare in (("WPR", wpr_file, prepare_wpr_upload), ("DMR", dmr_file, prepare_dmr_upload)):
+        if file is None:
+            continue
+        try:
+            rows, rejected = prepare(read_upload(file))
+        except Exception as e:
+            st.error(f"❌ Could not read the {label} file — {e}")
+            continue
+        prepared[label] = rows
+        st.write(f"**{label}:** {len(rows):,} valid rows, {len(rejected):,} rejected")
+        if len(rejected):
+            with st.expander(f"Rejected {label} rows"):
+                st.dataframe(rejected, use_container_width=True)
+
+    job = upload_job_status(st.session_state.get("wo360_upload_job"))
+    if st.button("Upload to Cloud Vault", disabled=not prepared or (job or {}).get("status") == "running"):
+        # 🚨 The write runs on its own thread; this script run returns immediately
+        st.session_state["wo360_upload_job"] = start_upload_job(prepared.get("WPR"), prepared.get("DMR"))
+        job = upload_job_status(st.session_state["wo360_upload_job"])
+    if job is not None:
+        if job["status"] == "running":
+            poll_upload_job(job["id"])
+        else:
+            show_upload_job(job)
 
 # Simple password protection
 def check_password():
@@ -53,16 +109,31 @@ st.markdown(
 )
 
 # 🚨 GLOBAL FIX: Cache Data Loading Functions for Performance
-
-@st.cache_data(ttl=600) # Cache data for 10 minutes
-def load_maintenance_data():
-    df = get_table("maintenance_reports")
+# Parsed frames are kept per process and refreshed by delta (only rows past the
+# last seen id are fetched and parsed), see utils.load_delta_frame. They hold no
+# long free text (HEAVY_TEXT_COLUMNS); paged table views read it with their page.
+# 🚨 The same frame object is shared by every session: pages filter and slice it but
+# never assign into it, so display columns are derived once in the parse functions.
+
+def load_frame(table, parse, **options):
+    """load_delta_frame() plus the time it took in this rerun (sidebar "Frame loading")."""
+    started = time.perf_counter()
+    frame = load_delta_frame(table, parse, copy=st.session_state.get("copy_frames", False), **options)
+    st.session_state["frame_load_ms"] = st.session_state.get("frame_load_ms", 0.0) + (time.perf_counter() - started) * 1000
+    return frame
+
+def parse_maintenance_data(df):
     df['report_date'] = pd.to_datetime(df['report_date'], errors='coerce')
     return df
 
-@st.cache_data(ttl=600)
-def load_wpr_data():
-    wpr = get_table("WPR")
+def load_maintenance_data():
+    # 'date' is never shown on the dashboard, so it is not read either
+    return load_frame(
+        "maintenance_reports", parse_maintenance_data,
+        exclude=[*HEAVY_TEXT_COLUMNS["maintenance_reports"], "date"], compact=True,
+    )
+
+def parse_wpr_data(wpr):
     #print(wpr.columns.tolist())
     #print('time of requesting permit')
     #print(wpr['time_of_requesting_permit'])
@@ -79,730 +150,852 @@ def load_wpr_data():
     wpr['work_finish_time'] = pd.to_datetime(wpr['work_finish_time'], errors='coerce')
 
     
-    # 2. Robust Time Parsing Function (FIXED to handle NaT and invalid strings)
-    def parse_time_only(t):
-            if pd.isna(t) or not str(t).strip() or str(t).lower() == 'nat':
-                return None
-            
-            s = str(t).strip()
-            
-            # 🚨 FIX 1: Replace semicolon with colon and strip milliseconds
-            # This handles '13;20' and '07:00:00.000000'
-            s = s.replace(";", ":")
-            
-            # Optional: Try to remove milliseconds if present, as they mess up simple format inferral
-            if '.' in s:
-                s = s.split('.')[0]
-            
-            # Coerce string into a datetime object (trying common HH:MM:SS and HH:MM formats)
-            dt = pd.to_datetime(s, format='%H:%M:%S', errors='coerce')
-            if pd.isna(dt):
-                dt = pd.to_datetime(s, format='%H:%M', errors='coerce')
-            
-            # Check if coercion failed (resulted in NaT)
-            if pd.isna(dt):
-                return None
-            
-            # 🚨 FIX 2: Return a formatted string for display in Streamlit
-            return dt.strftime('%H:%M')
-
-    # Apply fix to all time columns
-    # 🚨 FIX for ValueError: NaTType
+    # 2. Robust Time Parsing (vectorized; handles '13;20', '07:00:00.000000' and NaT)
     time_cols = ["time_of_requesting_permit", "time_of_issuer_starting_swp_preperation", "time_of_permit_issuance", "swp_closing_time"]
     for col in time_cols:
         # Check if the column exists to prevent error on get_table result
         if col in wpr.columns:
-            wpr[col] = wpr[col].apply(parse_time_only)
+            wpr[col] = normalize_times(wpr[col])['hhmm']
 
-    # 3. Calculation Conversions
-    wpr['work_duration'] = wpr['(m-l)'].apply(time_to_hours)
-    wpr['total_permit_time'] = wpr['(n-i)'].apply(time_to_hours)
-    wpr['efficiency'] = round(pd.to_numeric(wpr['(m-l)/(n-i)'], errors='coerce'),2)
+    # 3. KPIs arrive computed by Postgres interval arithmetic (vw_wpr_durations, migration 006)
+    wpr['work_duration'] = wpr['work_hours']
+    wpr['total_permit_time'] = wpr['permit_cycle_hours']
     # Ensure numeric types for calculation columns
     numeric_cols = ['work_duration', 'total_permit_time', 'efficiency']
     for col in numeric_cols:
         if col in wpr.columns:
             wpr[col] = pd.to_numeric(wpr[col], errors='coerce')
+
+    # 4. Display columns, derived once here instead of on every rerun
+    wpr['Work Duration (H:M)'] = format_timedelta_to_h_m_series(pd.to_timedelta(wpr['work_duration'], unit='h'))
+    wpr['Permit Cycle (H:M)'] = format_timedelta_to_h_m_series(pd.to_timedelta(wpr['total_permit_time'], unit='h'))
+    for col in numeric_cols:
+        wpr[col] = wpr[col].round(2)
+    wpr['Efficiency (%)'] = wpr['efficiency']
+    # Permit close time from the actual start/finish stamps
+    wpr['duration'] = (wpr['work_finish_time'] - wpr['work_actual_start_time']).dt.total_seconds() / 3600
     return wpr
 
+PERMIT_TABLE_COLUMNS = [
+    'receiver_name', 'position', 'date', 'crew_members', 'wo_number', 'wo_description',
+    'permit_number', 'plant/rtm_no', 'time_of_requesting_permit',
+    'time_of_issuer_starting_swp_preperation', 'time_of_permit_issuance',
+    'work_actual_start_time', 'work_finish_time', 'swp_closing_time', 'remarks',
+    'Work Duration (H:M)', 'Permit Cycle (H:M)', 'Efficiency (%)'
+]
+
+def format_permit_page(page):
+    """One page of vw_wpr_durations -> the Permit Table columns."""
+    return parse_wpr_data(page)[PERMIT_TABLE_COLUMNS]
+
+def load_wpr_data():
+    return load_frame(
+        WPR_DURATIONS_VIEW, parse_wpr_data, depends_on=["WPR"],
+        exclude=HEAVY_TEXT_COLUMNS[WPR_DURATIONS_VIEW], compact=True,
+    )
+
+def load_page_table(table):
+    """MAP / QC / Safety page data: kept in memory and revalidated by fingerprint on every rerun."""
+    # 🚨 refresh_every=0: a COUNT/MAX probe runs each time, rows are only read when it changes
+    return load_frame(table, lambda frame: frame, refresh_every=0)
+
+
+
+# ---- Paginated table views: only the visible page reaches the browser ----
+def _pager_state(key, signature):
+    """Pager state in session_state: one cursor per visited page, reset when sort/size/filters change."""
+    state = st.session_state.setdefault(f"{key}_pager", {"signature": None, "cursors": [None]})
+    if state["signature"] != signature:
+        state.update(signature=signature, cursors=[None])
+    return state
+
+def _pager_controls(key, sort_options, default_sort=None):
+    c1, c2, c3 = st.columns([2, 1, 1])
+    index = sort_options.index(default_sort) if default_sort in sort_options else 0
+    sort = c1.selectbox("Sort by", sort_options, index=index, key=f"{key}_sort")
+    descending = c2.toggle("Descending", value=True, key=f"{key}_desc")
+    page_size = c3.selectbox("Rows per page", [25, 50, 100, 250], index=1, key=f"{key}_size")
+    return sort, descending, page_size
+
+def _pager_nav(key, state, total, page_size, next_cursor):
+    number, pages = len(state["cursors"]), max(1, -(-total // page_size))
+    prev, info, nxt = st.columns([1, 3, 1])
+    if prev.button("◀ Previous", key=f"{key}_prev", disabled=number == 1):
+        state["cursors"].pop()
+        st.rerun()
+    info.caption(f"Page {number} of {pages} · {total:,} rows")
+    if nxt.button("Next ▶", key=f"{key}_next", disabled=number >= pages or next_cursor is None):
+        state["cursors"].append(next_cursor)
+        st.rerun()
+
+def paged_table(key, table, date_range=None, filters=None, sort_options=None, default_sort=None, columns=None, prepare=None):
+    """Table view paged in Postgres by keyset (sort column, id); the count comes from `count_rows`."""
+    sort_options = sort_options or ["id"]
+    sort, descending, page_size = _pager_controls(key, sort_options, default_sort)
+    state = _pager_state(key, (sort, descending, page_size, str(date_range), str(filters)))
+    total = count_rows(table, date_range, filters)
+    page = get_table_page(table, columns, date_range, filters, sort, descending, state["cursors"][-1], page_size)
+    next_cursor = (page[sort].iloc[-1], page["id"].iloc[-1]) if len(page) == page_size else None
+    st.dataframe(prepare(page) if prepare else page, use_container_width=True, hide_index=True)
+    _pager_nav(key, state, total, page_size, next_cursor)
+
+def paged_frame(key, frame, sort_options=None, default_sort=None):
+    """Same pager over a frame already in memory, for filters SQL can't express."""
+    sort_options = sort_options or list(frame.columns)
+    sort, descending, page_size = _pager_controls(key, sort_options, default_sort)
+    state = _pager_state(key, (sort, descending, page_size, len(frame)))
+    number = len(state["cursors"])
+    ordered = frame.sort_values(sort, ascending=not descending, na_position="last", kind="stable")
+    st.dataframe(ordered.iloc[(number - 1) * page_size: number * page_size], use_container_width=True, hide_index=True)
+    _pager_nav(key, state, len(frame), page_size, number)
+
+
+# ---- Chart panels: a panel's own widgets rerun only that panel (st.fragment) ----
+def log_latency(kind, name, started):
+    """Keep this session's last 20 interaction timings for the sidebar."""
+    log = st.session_state.setdefault("latency_log", [])
+    log.append({
+        "rerun": kind, "name": name, "fragments": st.session_state.get("use_fragments", True),
+        "ms": round((time.perf_counter() - started) * 1000, 1),
+    })
+    del log[:-20]
+
+def panel(func):
+    """Decorator: render a chart/KPI panel as a fragment that depends only on its arguments.
+
+    With fragments switched off in the sidebar the panel runs inline, so its widgets
+    rerun the whole page again; the latency log shows both for comparison.
+    """
+    @functools.wraps(func)
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        func(*args, **kwargs)
+        if not st.session_state.get("page_running"):  # a panel-only rerun
+            log_latency("panel", args[0] if args and isinstance(args[0], str) else func.__name__, started)
+
+    fragment = st.fragment(timed)
+
+    @functools.wraps(func)
+    def render(*args, **kwargs):
+        (fragment if st.session_state.get("use_fragments", True) else timed)(*args, **kwargs)
+    return render
+
+@panel
+def counts_panel(label, table, column, date_range=None, filters=None, default=False, title=None, **options):
+    """Checkbox-toggled bar chart of `get_counts(table, column, ...)`; `options` go to get_counts."""
+    if st.checkbox(label, value=default):
+        st.subheader(title or label)
+        st.bar_chart(get_counts(table, column, date_range, filters, **options), use_container_width=True)
+
+def present_counts(values):
+    """value_counts() without the zero rows a compacted (categorical) column keeps for filtered-out values."""
+    counts = values.value_counts()
+    return counts[counts > 0]
+
+@panel
+def value_counts_panel(label, values, default=False, title=None):
+    """Checkbox-toggled bar chart of `values.value_counts()` for a series already in memory."""
+    if st.checkbox(label, value=default):
+        st.write(f"### {title or label}")
+        st.bar_chart(present_counts(values), use_container_width=True)
+
+@panel
+def map_time_panel(map_range):
+    granularity = st.radio(
+        "Select Time Granularity",
+        ('Monthly', 'Weekly', 'Daily'),
+        index=0
+    )
+
+    if granularity == 'Daily':
+        daily = get_time_series("MAP", "day", map_range)['count'].rename("Activities per Day")
+        st.line_chart(daily, use_container_width=True)
+
+    elif granularity == 'Weekly':
+        weekly = get_time_series("MAP", "week", map_range)['count']
+        weekly.index = weekly.index.to_period("W").astype(str)
+        st.bar_chart(weekly.rename("Activities per Week"), use_container_width=True)
+
+    else: # Default is 'Monthly'
+        monthly = get_time_series("MAP", "month", map_range)['count']
+        monthly.index = monthly.index.to_period("M").astype(str)
+        st.bar_chart(monthly.rename("Activities per Month"), use_container_width=True)
+
+@panel
+def permit_breakdown_panel(filtered):
+    # ENHANCEMENT: Toggle for RTM/Plant vs Crew
+    chart_selection = st.radio(
+        "Permit Breakdown By:",
+        ("Plant/RTM Number", "Crew Members"),
+        horizontal=True
+    )
+    st.subheader(f"Permits by {chart_selection}")
+
+    if chart_selection == "Plant/RTM Number" and 'plant/rtm_no' in filtered.columns:
+        st.bar_chart(present_counts(filtered['plant/rtm_no']).head(10), use_container_width=True)
+    elif chart_selection == "Crew Members" and 'crew_members' in filtered.columns:
+        st.bar_chart(present_counts(filtered['crew_members']).head(10), use_container_width=True)
+    else:
+        st.info(f"Column '{'plant/rtm_no' if chart_selection == 'Plant/RTM Number' else 'crew_members'}' not available or empty.")
+
+@panel
+def efficiency_trend_panel(filtered):
+    if st.checkbox("Show Efficiency Trend Over Time", value=False):
+        st.subheader("Efficiency Trend Over Time")
+        eff_trend = filtered.set_index('date').resample('D')['efficiency'].mean().dropna()
+        st.line_chart(eff_trend, use_container_width=True)
+
 
 # ======================================================================
 # APPLICATION START
 # ======================================================================
 
 if check_password():
-    # ---- SIDEBAR NAV ----
-    st.sidebar.title("Site Reporting Dashboard")
+    # Whole-page run time of this interaction; panel-only reruns are logged by `panel`
+    page_started = time.perf_counter()
+    st.session_state["page_running"] = True
+    menu = None
+    try:
+        # ---- SIDEBAR NAV ----
+        st.sidebar.title("Site Reporting Dashboard")
     
-    menu = st.sidebar.radio(
-        "Go to",
-        [
-            # 1. WO 360 Entry
-            "🧾 WO 360 Entry",
-            # 2. Maintenance Dashboard
-            "📊 Maintenance Dashboard",
-            # 3. MAP Dashboard
-            "📊 Dashboard", 
-            # 4. WO & Permit Overview
-            "🔗 WO & Permit Overview",
-            # 5. Permit Dashboard
-            "📊 Permit Dashboard",
-            # 6. QC Dashboard
-            "📊 QC Dashboard",
-            # 7. Safety Dashboard
-            "📊 Safety Dashboard",
-        ]
-    )
-
-    # ----------------------------------------------------------------------
-    # ---- 1. WO 360 ENTRY (CLOUD SYNC REFACTORED) ----
-    # ----------------------------------------------------------------------
-    if menu == "🧾 WO 360 Entry":
-        st.title("WO 360 — Single Entry (Cloud Sync)")
+        menu = st.sidebar.radio(
+            "Go to",
+            [
+                # 1. WO 360 Entry
+                "🧾 WO 360 Entry",
+                # 2. Maintenance Dashboard
+                "📊 Maintenance Dashboard",
+                # 3. MAP Dashboard
+                "📊 Dashboard", 
+                # 4. WO & Permit Overview
+                "🔗 WO & Permit Overview",
+                # 5. Permit Dashboard
+                "📊 Permit Dashboard",
+                # 6. QC Dashboard
+                "📊 QC Dashboard",
+                # 7. Safety Dashboard
+                "📊 Safety Dashboard",
+                # 8. Full-text search
+                "🔍 Search Records",
+            ]
+        )
+        # Frames kept by the loaders in this process (sizes as of the previous run)
+        with st.sidebar.expander("Memory per dataset"):
+            st.dataframe(delta_store_memory(), hide_index=True, use_container_width=True)
+        # Loader time of the previous rerun; switch copies on to compare with per-rerun copying
+        with st.sidebar.expander("Frame loading"):
+            st.toggle("Copy shared frames on every rerun", key="copy_frames")
+            st.metric("Load time, previous rerun", f"{st.session_state.pop('frame_load_ms', 0.0):.1f} ms")
+            copies = frame_copy_stats()
+            st.caption(f"{copies['copies']:,} copies in this process · {copies['seconds'] * 1000:,.0f} ms · {copies['bytes'] / 2**20:,.1f} MB")
+        # Switch fragments off to measure the same interactions as full-page reruns
+        with st.sidebar.expander("Interaction latency"):
+            st.toggle("Isolate chart panels (fragments)", value=True, key="use_fragments")
+            latency = pd.DataFrame(st.session_state.get("latency_log", []), columns=["rerun", "name", "fragments", "ms"])
+            if len(latency):
+                st.dataframe(latency.groupby(["fragments", "rerun"])["ms"].agg(["count", "mean", "max"]).round(1), use_container_width=True)
+                st.dataframe(latency.tail(10), hide_index=True, use_container_width=True)
+
+        # ----------------------------------------------------------------------
+        # ---- 1. WO 360 ENTRY (CLOUD SYNC REFACTORED) ----
+        # ----------------------------------------------------------------------
+        if menu == "🧾 WO 360 Entry":
+            st.title("WO 360 — Single Entry (Cloud Sync)")
+
+            entry_mode = st.radio("Entry Mode", ["Single WO Form", "Spreadsheet Upload"], horizontal=True)
+            if entry_mode == "Spreadsheet Upload":
+                render_bulk_upload()
+                st.stop()
         
-        # --- Local Helpers ---
-        def parse_date(d):
-            return pd.to_datetime(d, errors="coerce")
-
-        def parse_time(t):
-            if t is None or (isinstance(t, float) and pd.isna(t)) or (isinstance(t, str) and not t.strip()):
-                return None
-            s = str(t).strip().replace(";", ":")
-            try:
-                parts = s.split(":")
-                if len(parts) == 2:
-                    s = f"{int(parts[0]):02d}:{int(parts[1]):02d}:00"
-                elif len(parts) == 3:
-                    s = f"{int(parts[0]):02d}:{int(parts[1]):02d}:{int(float(parts[2])):02d}"
-                else: return None
-                datetime.strptime(s, "%H:%M:%S")
-                return s
-            except Exception: return None
-
-        # --- Entry Form ---
-        # 🚨 UI variables are defined inside this block to ensure they stay in scope
-        with st.form("wo360", clear_on_submit=False):
-            st.subheader("Meta Data")
-            c1, c2, c3, c4 = st.columns(4)
-            wo_number = c1.text_input("WO Number *")
-            supervisor = c2.text_input("Supervisor Name")
-            department = c3.selectbox("Department / Section", ["", "Static", "Rotating", "Electrical", "Instrument", "Scaffolding", "Boom Truck", "Crane", "Insulation"])
-            shift = c4.selectbox("Shift", ["", "Day", "Night"])
-            done_by = st.text_input("Done By (default to Receiver Name if blank)")
-
-            st.subheader("Permit (WPR)")
-            c1, c2, c3, c4 = st.columns(4)
-            receiver_name = c1.text_input("Receiver Name")
-            position = c2.text_input("Position")
-            wpr_date = c3.date_input("WPR Date")
-            crew_members = c4.text_input("Crew Members")
-
-            c1, c2, c3, c4 = st.columns(4)
-            permit_number = c1.text_input("Permit Number")
-            plant_rtm_no = c2.text_input("Plant/RTM No")
-            wo_description = c3.text_input("WO Description")
-            wpr_remarks = c4.text_input("Remarks (WPR)")
-
-            c1, c2, c3 = st.columns(3)
-            t_req = c1.text_input("Time Requesting Permit (HH:MM)")
-            t_prep = c2.text_input("Issuer Start SWP Prep (HH:MM)")
-            t_issue = c3.text_input("Time of Permit Issuance (HH:MM)")
-
-            c1, c2, c3 = st.columns(3)
-            t_start = c1.text_input("Work Start (HH:MM)")
-            t_finish = c2.text_input("Work Finish (HH:MM)")
-            t_close = c3.text_input("SWP Closing (HH:MM)")
-
-            st.subheader("DMR (Maintenance Report)")
-            c1, c2, c3 = st.columns(3)
-            area = c1.text_input("Area")
-            unit = c2.text_input("Unit")
-            tag_number = c3.text_input("Tag Number")
-
-            observation = st.text_area("Observation / findings")
-            recommendation = st.text_area("Recommendation")
-
-            c1, c2, c3 = st.columns(3)
-            mr_date = c1.date_input("Maintenance Date")
-            status = c2.selectbox("Status", ["Open", "On-progress", "Completed", "Cancelled"])
-            reason_remark = c3.text_input("Reason / Remark")
-
-            c1, c2 = st.columns(2)
-            root_cause = c1.text_input("Root Cause")
-            section = c2.text_input("Section", value=department or "")
-
-            report_date = st.date_input("Report Date")
+            # --- Local Helpers ---
+            def parse_date(d):
+                return pd.to_datetime(d, errors="coerce")
+
+            # --- Entry Form ---
+            # 🚨 UI variables are defined inside this block to ensure they stay in scope
+            with st.form("wo360", clear_on_submit=False):
+                st.subheader("Meta Data")
+                c1, c2, c3, c4 = st.columns(4)
+                wo_number = c1.text_input("WO Number *")
+                supervisor = c2.text_input("Supervisor Name")
+                department = c3.selectbox("Department / Section", ["", "Static", "Rotating", "Electrical", "Instrument", "Scaffolding", "Boom Truck", "Crane", "Insulation"])
+                shift = c4.selectbox("Shift", ["", "Day", "Night"])
+                done_by = st.text_input("Done By (default to Receiver Name if blank)")
+
+                st.subheader("Permit (WPR)")
+                c1, c2, c3, c4 = st.columns(4)
+                receiver_name = c1.text_input("Receiver Name")
+                position = c2.text_input("Position")
+                wpr_date = c3.date_input("WPR Date")
+                crew_members = c4.text_input("Crew Members")
+
+                c1, c2, c3, c4 = st.columns(4)
+                permit_number = c1.text_input("Permit Number")
+                plant_rtm_no = c2.text_input("Plant/RTM No")
+                wo_description = c3.text_input("WO Description")
+                wpr_remarks = c4.text_input("Remarks (WPR)")
+
+                c1, c2, c3 = st.columns(3)
+                t_req = c1.text_input("Time Requesting Permit (HH:MM)")
+                t_prep = c2.text_input("Issuer Start SWP Prep (HH:MM)")
+                t_issue = c3.text_input("Time of Permit Issuance (HH:MM)")
+
+                c1, c2, c3 = st.columns(3)
+                t_start = c1.text_input("Work Start (HH:MM)")
+                t_finish = c2.text_input("Work Finish (HH:MM)")
+                t_close = c3.text_input("SWP Closing (HH:MM)")
+
+                st.subheader("DMR (Maintenance Report)")
+                c1, c2, c3 = st.columns(3)
+                area = c1.text_input("Area")
+                unit = c2.text_input("Unit")
+                tag_number = c3.text_input("Tag Number")
+
+                observation = st.text_area("Observation / findings")
+                recommendation = st.text_area("Recommendation")
+
+                c1, c2, c3 = st.columns(3)
+                mr_date = c1.date_input("Maintenance Date")
+                status = c2.selectbox("Status", ["Open", "On-progress", "Completed", "Cancelled"])
+                reason_remark = c3.text_input("Reason / Remark")
+
+                c1, c2 = st.columns(2)
+                root_cause = c1.text_input("Root Cause")
+                section = c2.text_input("Section", value=department or "")
+
+                report_date = st.date_input("Report Date")
             
-            submitted = st.form_submit_button("Submit to Cloud Vault")
+                submitted = st.form_submit_button("Submit to Cloud Vault")
+
+            # 🚨 This block only runs after the button is pressed
+            if submitted:
+                if not wo_number.strip():
+                    st.error("Dharma Violation: WO Number is required.")
+                    st.stop()
+
+                # 1. Standardize Time Data (same parser as the WPR loader)
+                times = normalize_times(pd.Series({
+                    "time_of_requesting_permit": t_req,
+                    "time_of_issuer_starting_swp_preperation": t_prep,
+                    "time_of_permit_issuance": t_issue,
+                    "work_actual_start_time": t_start,
+                    "work_finish_time": t_finish,
+                    "swp_closing_time": t_close
+                }, dtype=object))['hhmmss']
+                times = times.astype(object).where(times.notna(), None).to_dict()
 
-        # 🚨 This block only runs after the button is pressed
-        if submitted:
-            if not wo_number.strip():
-                st.error("Dharma Violation: WO Number is required.")
-                st.stop()
-
-            # 1. Standardize Time Data
-            times = {k: parse_time(v) for k, v in {
-                "time_of_requesting_permit": t_req,
-                "time_of_issuer_starting_swp_preperation": t_prep,
-                "time_of_permit_issuance": t_issue,
-                "work_actual_start_time": t_start,
-                "work_finish_time": t_finish,
-                "swp_closing_time": t_close
-            }.items()}
-
-            try:
-                # 2. Establish Cloud Connection
-                conn = get_connection() 
-                with conn: # Handles Transaction automatically
-                    with conn.cursor() as cur:
-                        # 3) UPSERT Meta Data (Postgres Syntax)
-                        cur.execute("""
-                            INSERT INTO work_order_meta (wo_number, supervisor, department, shift, done_by)
-                            VALUES (%s, %s, %s, %s, %s)
-                            ON CONFLICT(wo_number) DO UPDATE SET
-                                supervisor=EXCLUDED.supervisor,
-                                department=EXCLUDED.department,
-                                shift=EXCLUDED.shift,
-                                done_by=EXCLUDED.done_by
-                        """, (wo_number.strip(), supervisor or None, department or None, shift or None, done_by or receiver_name or None))
-
-                        # 4) Payload Creation
-                        wpr_payload = {
-                            "receiver_name": receiver_name or None,
-                            "position": position or None,
-                            "date": str(parse_date(wpr_date).date()),
-                            "crew_members": str(crew_members or "").strip() or None,
-                            "wo_number": wo_number.strip(),
-                            "wo_description": wo_description or None,
-                            "permit_number": permit_number or None,
-                            "plant/rtm_no": plant_rtm_no or None,
-                            **times,
-                            "remarks": wpr_remarks or None,
-                            "(m-l)": None, "(n-i)": None, "(m-l)/(n-i)": None
-                        }
-
-                        dmr_payload = {
-                            "area": area or None,
-                            "unit": unit or None,
-                            "tag_number": tag_number or None,
-                            "wo_number": wo_number.strip(),
-                            "observation": observation or None,
-                            "recommendation": recommendation or None,
-                            "date": str(parse_date(mr_date).date()),
-                            "status": status,
-                            "reason_remark": reason_remark or None,
-                            "root_cause": root_cause or None,
-                            "section": (section or department or None),
-                            "report_date": str(parse_date(report_date).date())
-                        }
-
-                        # 5) Cloud Injection via Utils helpers
-                        insert_wpr(conn, wpr_payload)
-                        insert_dmr(conn, dmr_payload)
-
-                st.success(f"✅ WO {wo_number} synchronized with Frankfurt Cloud Vault.")
-                st.cache_data.clear() # Refresh dashboards with fresh cloud data
-
-            except Exception as e:
-                st.error(f"❌ Cloud Sync Failed — {e}")
-
-    # ----------------------------------------------------------------------
-    # ---- 2. MAINTENANCE DASHBOARD (ENHANCED) ----
-    # ----------------------------------------------------------------------
-    elif menu == "📊 Maintenance Dashboard":
-        st.title("Maintenance Dashboard")
-        st.write("This dashboard provides insights into maintenance reports submitted by employees.")
-
-        # Load data using the cached function
-        df = load_maintenance_data()
-        df = df.drop(columns='date', errors='ignore')
-
-        with st.expander("🔎 Filter Records", expanded=False):
-            col1, col2, col3, col4 = st.columns(4)
+                try:
+                    # 2. Borrow a pooled Cloud Connection
+                    with get_connection() as conn, conn: # Handles Transaction automatically
+                        with conn.cursor() as cur:
+                            # 3) UPSERT Meta Data (Postgres Syntax)
+                            cur.execute("""
+                                INSERT INTO work_order_meta (wo_number, supervisor, department, shift, done_by)
+                                VALUES (%s, %s, %s, %s, %s)
+                                ON CONFLICT(wo_number) DO UPDATE SET
+                                    supervisor=EXCLUDED.supervisor,
+                                    department=EXCLUDED.department,
+                                    shift=EXCLUDED.shift,
+                                    done_by=EXCLUDED.done_by
+                            """, (wo_number.strip(), supervisor or None, department or None, shift or None, done_by or receiver_name or None))
+
+                            # 4) Payload Creation
+                            wpr_payload = {
+                                "receiver_name": receiver_name or None,
+                                "position": position or None,
+                                "date": str(parse_date(wpr_date).date()),
+                                "crew_members": str(crew_members or "").strip() or None,
+                                "wo_number": wo_number.strip(),
+                                "wo_description": wo_description or None,
+                                "permit_number": permit_number or None,
+                                "plant/rtm_no": plant_rtm_no or None,
+                                **times,
+                                "remarks": wpr_remarks or None,
+                                "(m-l)": None, "(n-i)": None, "(m-l)/(n-i)": None
+                            }
+
+                            dmr_payload = {
+                                "area": area or None,
+                                "unit": unit or None,
+                                "tag_number": tag_number or None,
+                                "wo_number": wo_number.strip(),
+                                "observation": observation or None,
+                                "recommendation": recommendation or None,
+                                "date": str(parse_date(mr_date).date()),
+                                "status": status,
+                                "reason_remark": reason_remark or None,
+                                "root_cause": root_cause or None,
+                                "section": (section or department or None),
+                                "report_date": str(parse_date(report_date).date())
+                            }
+
+                            # 5) Cloud Injection via Utils helpers
+                            insert_wpr(conn, wpr_payload)
+                            insert_dmr(conn, dmr_payload)
+
+                    st.success(f"✅ WO {wo_number} synchronized with Frankfurt Cloud Vault.")
+                    # Invalidate only the datasets built from the tables this submission wrote
+                    bump_table_versions("WPR", "maintenance_reports", "work_order_meta", "wo_permit_overview", "kpi_daily")
+
+                except Exception as e:
+                    st.error(f"❌ Cloud Sync Failed — {e}")
+
+        # ----------------------------------------------------------------------
+        # ---- 2. MAINTENANCE DASHBOARD (ENHANCED) ----
+        # ----------------------------------------------------------------------
+        elif menu == "📊 Maintenance Dashboard":
+            st.title("Maintenance Dashboard")
+            st.write("This dashboard provides insights into maintenance reports submitted by employees.")
+
+            # Load data using the cached function
+            df = load_maintenance_data()
+
+            with st.expander("🔎 Filter Records", expanded=False):
+                col1, col2, col3, col4 = st.columns(4)
             
-            min_date, max_date = df['report_date'].min(), df['report_date'].max()
-            date_range = col1.date_input("Date Range", [min_date, max_date])
-            areas = sorted(df['area'].dropna().unique())
-            area_select = col2.multiselect("Area", areas, default=None)
-            statuses = sorted(df['status'].dropna().unique())
-            status_select = col3.multiselect("Status", statuses, default=None)
-            sections = sorted(df['section'].dropna().unique())
-            section_select = col4.multiselect("Section", sections, default=None)
-
-            filtered = df.copy()
-            if len(date_range) == 2:
-                start, end = [pd.to_datetime(d) for d in date_range]
-                filtered = filtered[(filtered['report_date'] >= start) & (filtered['report_date'] <= end)]
-            if area_select:
-                filtered = filtered[filtered['area'].isin(area_select)]
-            if status_select:
-                filtered = filtered[filtered['status'].isin(status_select)]
-            if section_select:
-                filtered = filtered[filtered['section'].isin(section_select)]
-
-            show_open = st.checkbox("Show only Open/On-progress Permits", value=False)
-            if show_open:
-                filtered = filtered[filtered['status'].str.lower().str.contains("open|on-progress", na=False)]
+                min_date, max_date = df['report_date'].min(), df['report_date'].max()
+                date_range = col1.date_input("Date Range", [min_date, max_date])
+                areas = sorted(df['area'].dropna().unique())
+                area_select = col2.multiselect("Area", areas, default=None)
+                statuses = sorted(df['status'].dropna().unique())
+                status_select = col3.multiselect("Status", statuses, default=None)
+                sections = sorted(df['section'].dropna().unique())
+                section_select = col4.multiselect("Section", sections, default=None)
+
+                filtered = df
+                if len(date_range) == 2:
+                    start, end = [pd.to_datetime(d) for d in date_range]
+                    filtered = filtered[(filtered['report_date'] >= start) & (filtered['report_date'] <= end)]
+                if area_select:
+                    filtered = filtered[filtered['area'].isin(area_select)]
+                if status_select:
+                    filtered = filtered[filtered['status'].isin(status_select)]
+                if section_select:
+                    filtered = filtered[filtered['section'].isin(section_select)]
+
+                show_open = st.checkbox("Show only Open/On-progress Permits", value=False)
+                if show_open:
+                    filtered = filtered[filtered['status'].str.lower().str.contains("open|on-progress", na=False)]
+
+                # Same filters for the SQL aggregations; the open toggle becomes an IN list of matching statuses
+                mr_range = date_range if len(date_range) == 2 else None
+                mr_statuses = status_select or statuses
+                if show_open:
+                    mr_statuses = [s for s in mr_statuses if re.search("open|on-progress", s.lower())] or [""]
+                mr_filters = {"area": area_select, "status": mr_statuses if (status_select or show_open) else None, "section": section_select}
                 
-            st.write(f"Filtered records: **{len(filtered)}**")
-            st.dataframe(filtered, use_container_width=True)
+                st.write(f"Filtered records: **{len(filtered)}**")
+                paged_table(
+                    "mr_table", "maintenance_reports", mr_range, mr_filters,
+                    sort_options=["report_date", "area", "status", "section", "wo_number"],
+                    prepare=lambda page: page.drop(columns="date", errors="ignore"),
+                )
+            
+                # --- KPIs and Charts (grouped in Postgres) ---
+                status_counts = get_counts("maintenance_reports", "status", mr_range, mr_filters)
             
-            # --- KPIs and Charts ---
-            status_counts = filtered['status'].value_counts()
+                # 🚨 FIX: Remove Avg Resolution Time Logic since 'completion_date' is unavailable
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.metric("Total Records", len(filtered))
+                with col2:
+                    try:
+                        comp = int(status_counts.get("Completed", 0))
+                        total = len(filtered)
+                        st.metric("Completion Rate", f"{(comp/total*100):.1f}%" if total else "N/A")
+                    except Exception:
+                        st.metric("Completion Rate", "N/A")
+                # The previous third column for Avg Resolution Time is now omitted
+
+                st.write("---")
             
-            # 🚨 FIX: Remove Avg Resolution Time Logic since 'completion_date' is unavailable
+                # 🚨 STATUS CHART: Displaying the Status Breakdown
+                st.subheader("Current Status Breakdown")
+                st.bar_chart(status_counts, use_container_width=True) 
+            
+            # ... (Your trend analysis line charts remain outside the expander) ...
+            st.write("---")
+
+            st.subheader("📈 Trend Analysis for the Month")
+            trend = get_time_series("maintenance_reports", "day", mr_range, mr_filters, status_column="status")
+            daily = trend['count'].rename("Jobs per Day")
+            daily_completed = trend['completed'].rename("Completed Jobs per Day")
+            daily_on_progress = trend['on_progress'].rename("On-progress Jobs per Day")
+            daily_failed = trend['failed'].rename("Failures/Cancellations per Day")
             col1, col2 = st.columns(2)
+            col3, col4 = st.columns(2)
             with col1:
-                st.metric("Total Records", len(filtered))
+                st.subheader("Total Jobs Per Day")
+                st.line_chart(daily, use_container_width=True)
             with col2:
-                try:
-                    comp = int(status_counts.get("Completed", 0))
-                    total = len(filtered)
-                    st.metric("Completion Rate", f"{(comp/total*100):.1f}%" if total else "N/A")
-                except Exception:
-                    st.metric("Completion Rate", "N/A")
-            # The previous third column for Avg Resolution Time is now omitted
-
-            st.write("---")
-            
-            # 🚨 STATUS CHART: Displaying the Status Breakdown
-            st.subheader("Current Status Breakdown")
-            st.bar_chart(status_counts, use_container_width=True) 
-            
-        # ... (Your trend analysis line charts remain outside the expander) ...
-        st.write("---")
-
-        st.subheader("📈 Trend Analysis for the Month")
-        filtered['report_date'] = pd.to_datetime(filtered['report_date'], errors='coerce')
-        filtered = filtered[filtered['report_date'].notna()]
-        filtered['status_clean'] = filtered['status'].astype(str).str.strip().str.upper()
-        filtered['is_completed'] = filtered['status_clean'] == "COMPLETED"
-        filtered['is_on_progress'] = filtered['status_clean'].str.contains("ON-PROGRESS")
-        filtered['is_failed'] = filtered['status_clean'].isin(["CANCELLED", "FAILURE", "FAILED"])
-        daily = filtered.groupby(filtered['report_date'].dt.date).size().rename("Jobs per Day")
-        daily_completed = filtered.groupby(filtered['report_date'].dt.date)['is_completed'].sum().rename("Completed Jobs per Day")
-        daily_on_progress = filtered.groupby(filtered['report_date'].dt.date)['is_on_progress'].sum().rename("On-progress Jobs per Day")
-        daily_failed = filtered.groupby(filtered['report_date'].dt.date)['is_failed'].sum().rename("Failures/Cancellations per Day")
-        col1, col2 = st.columns(2)
-        col3, col4 = st.columns(2)
-        with col1:
-            st.subheader("Total Jobs Per Day")
-            st.line_chart(daily, use_container_width=True)
-        with col2:
-            st.subheader("Completed Jobs Per Day")
-            st.line_chart(daily_completed, use_container_width=True)
-        with col3:
-            st.subheader("On-progress Jobs Per Day")
-            st.line_chart(daily_on_progress, use_container_width=True)
-        with col4:
-            st.subheader("Failures/Cancellations per Day")
-            st.line_chart(daily_failed, use_container_width=True)
-
-
-    # ----------------------------------------------------------------------
-    # ---- 3. MAP DASHBOARD (UNCHANGED) ----
-    # ----------------------------------------------------------------------
-    elif menu == "📊 Dashboard":
-        st.title("MAP Activity Overview")
-        map_ = get_table("MAP")
-        map_['execution_date'] = pd.to_datetime(map_['execution_date'], errors='coerce')
-        min_date, max_date = map_['execution_date'].min(), map_['execution_date'].max()
-        date_range = st.date_input("MAP Date Range", [min_date, max_date], key="map_date")
-        if len(date_range) == 2:
-            start, end = [pd.to_datetime(d) for d in date_range]
-            map_ = map_[(map_['execution_date'] >= start) & (map_['execution_date'] <= end)]
-
-        st.write(f"Filtered records: **{len(map_)}**")
-
-        # --- Granularity Selector (Daily/Weekly/Monthly fix) ---
-        st.subheader("MAP Activities Over Time")
-        granularity = st.radio(
-            "Select Time Granularity",
-            ('Monthly', 'Weekly', 'Daily'),
-            index=0 
-        )
-        
-        if granularity == 'Daily':
-            daily = map_.groupby(map_['execution_date'].dt.date).size().rename("Activities per Day")
-            st.line_chart(daily, use_container_width=True)
-
-        elif granularity == 'Weekly':
-            weekly = map_.groupby(map_['execution_date'].dt.to_period("W")).size()
-            weekly.index = weekly.index.astype(str) 
-            st.bar_chart(weekly.rename("Activities per Week"), use_container_width=True)
-
-        else: # Default is 'Monthly'
-            monthly = map_.groupby(map_['execution_date'].dt.to_period("M")).size()
-            monthly.index = monthly.index.astype(str) 
-            st.bar_chart(monthly.rename("Activities per Month"), use_container_width=True)
-
-        # Toggle for area/type breakdowns
-        show_area = st.checkbox("Show Activities by Area", value=True)
-        show_type = st.checkbox("Show Activities by Type", value=True if 'maint_activ_type' in map_.columns else False)
-
-        if show_area:
-            st.subheader("Activities by Area")
-            st.bar_chart(map_['area'].value_counts(), use_container_width=True)
-
-        if show_type and 'maint_activ_type' in map_.columns:
-            st.subheader("Activities by Type")
-            st.bar_chart(map_['maint_activ_type'].value_counts(), use_container_width=True)
-
-        st.write("### MAP Activities Table")
-        st.dataframe(map_, use_container_width=True) 
-
-
-    # ----------------------------------------------------------------------
-    # ---- 4. WO & PERMIT OVERVIEW (UNCHANGED) ----
-    # ----------------------------------------------------------------------
-    elif menu == "🔗 WO & Permit Overview":
-        st.title("Unified Work Order & Permit Overview")
-        df = get_wo_permit_overview()
-
-        with st.expander("🔎 Filter Records", expanded=False):
-            col1, col2 = st.columns([2,3])
-            if not df['maintenance_report_date'].isnull().all():
-                min_date, max_date = pd.to_datetime(df['maintenance_report_date']).min(), pd.to_datetime(df['maintenance_report_date']).max()
-                date_range = col1.date_input("WO Report Date Range", [min_date, max_date])
-            else:
-                date_range = None
-            areas = sorted(df['maintenance_area'].dropna().unique())
-            area_select = col2.multiselect("Maintenance Area", areas, default=None)
-            filtered = df.copy()
-            if date_range and len(date_range) == 2:
+                st.subheader("Completed Jobs Per Day")
+                st.line_chart(daily_completed, use_container_width=True)
+            with col3:
+                st.subheader("On-progress Jobs Per Day")
+                st.line_chart(daily_on_progress, use_container_width=True)
+            with col4:
+                st.subheader("Failures/Cancellations per Day")
+                st.line_chart(daily_failed, use_container_width=True)
+
+
+        # ----------------------------------------------------------------------
+        # ---- 3. MAP DASHBOARD (UNCHANGED) ----
+        # ----------------------------------------------------------------------
+        elif menu == "📊 Dashboard":
+            st.title("MAP Activity Overview")
+            map_ = load_page_table("MAP")
+            min_date, max_date = map_['execution_date'].min(), map_['execution_date'].max()
+            date_range = st.date_input("MAP Date Range", [min_date, max_date], key="map_date")
+            map_range = date_range if len(date_range) == 2 else None
+            if map_range:
                 start, end = [pd.to_datetime(d) for d in date_range]
-                filtered = filtered[
-                    (pd.to_datetime(filtered['maintenance_report_date']) >= start) & (pd.to_datetime(filtered['maintenance_report_date']) <= end)
-                ]
-            if area_select:
-                filtered = filtered[filtered['maintenance_area'].isin(area_select)]
-        with col1:
-            st.subheader("KPI Cards")
-            st.metric("Total Work Orders", len(filtered))
-            st.metric("WOs with Permits", filtered['permit_number'].notna().sum())
-            eff_numeric = pd.to_numeric(filtered['efficiency'], errors='coerce')
-            if eff_numeric.notna().sum() > 0:
-                st.metric("Avg Efficiency", f"{eff_numeric.mean():.2f}")
-            else:
-                st.metric("Avg Efficiency", "N/A")
-        with col2:
-            if st.checkbox("Show WOs With/Without Permit Chart", value=True):
-                st.write("### WOs With/Without Permit")
-                st.bar_chart(filtered['permit_number'].notna().value_counts(), use_container_width=True)
-        st.write("### Linked WO & Permit Table")
-        st.dataframe(filtered, use_container_width=True) 
-        if st.checkbox("Show WO by Area Chart", value=True):
-            st.write("### Work Orders by Area")
-            st.bar_chart(filtered['maintenance_area'].value_counts(), use_container_width=True)
-
-
-    # ----------------------------------------------------------------------
-    # ---- 5. PERMIT DASHBOARD (ENHANCED) ----
-    # ----------------------------------------------------------------------
-    elif menu == "📊 Permit Dashboard":
-        st.title("Work Permit & Efficiency Dashboard (WPR Table)")
-
-        # Load data using the cached function
-        wpr = load_wpr_data()
+                map_ = map_[(map_['execution_date'] >= start) & (map_['execution_date'] <= end)]
+
+            st.write(f"Filtered records: **{len(map_)}**")
+
+            # --- Granularity Selector (Daily/Weekly/Monthly fix) ---
+            st.subheader("MAP Activities Over Time")
+            map_time_panel(map_range)
+
+            # Toggles for area/type breakdowns
+            counts_panel("Show Activities by Area", "MAP", "area", map_range, default=True, title="Activities by Area")
+            if 'maint_activ_type' in map_.columns:
+                counts_panel("Show Activities by Type", "MAP", "maint_activ_type", map_range, default=True, title="Activities by Type")
+
+            st.write("### MAP Activities Table")
+            paged_table("map_table", "MAP", map_range, sort_options=["execution_date", "area", "maint_activ_type", "wo_＃"])
+
+
+        # ----------------------------------------------------------------------
+        # ---- 4. WO & PERMIT OVERVIEW (UNCHANGED) ----
+        # ----------------------------------------------------------------------
+        elif menu == "🔗 WO & Permit Overview":
+            st.title("Unified Work Order & Permit Overview")
+
+            with st.expander("🔎 Filter Records", expanded=False):
+                col1, col2 = st.columns([2,3])
+                # Widget options come from the indexed summary table; the filters run in SQL
+                min_date, max_date = get_date_bounds("wo_permit_overview")
+                if min_date is not None:
+                    date_range = col1.date_input("WO Report Date Range", [min_date, max_date])
+                else:
+                    date_range = None
+                areas = get_distinct_values("wo_permit_overview", "maintenance_area")
+                area_select = col2.multiselect("Maintenance Area", areas, default=None)
+                overview_range = date_range if date_range and len(date_range) == 2 else None
+                rollup = st.checkbox("One row per WO (rollup)", value=True)
+                if rollup:
+                    # Child tables are aggregated per WO in SQL, so KPIs are not inflated by join fan-out
+                    filtered = get_wo_permit_rollup(overview_range, area_select)
+                    has_permit = filtered['permit_count'] > 0
+                    eff_numeric = pd.to_numeric(filtered['avg_efficiency'], errors='coerce')
+                else:
+                    filtered = get_wo_permit_overview(overview_range, area_select)
+                    has_permit = filtered['permit_number'].notna()
+                    eff_numeric = pd.to_numeric(filtered['efficiency'], errors='coerce')
+            with col1:
+                st.subheader("KPI Cards")
+                st.metric("Total Work Orders", len(filtered))
+                st.metric("WOs with Permits", has_permit.sum())
+                if eff_numeric.notna().sum() > 0:
+                    st.metric("Avg Efficiency", f"{eff_numeric.mean():.2f}")
+                else:
+                    st.metric("Avg Efficiency", "N/A")
+            with col2:
+                value_counts_panel("Show WOs With/Without Permit Chart", has_permit, default=True, title="WOs With/Without Permit")
+            st.write("### Linked WO & Permit Table")
+            # Already loaded for the KPIs above, so this table pages in memory
+            paged_frame("overview_table", filtered, default_sort="maintenance_report_date")
+            if rollup and len(filtered):
+                drill_wo = st.selectbox("Drill down into WO", filtered['maintenance_wo'].dropna().unique())
+                st.dataframe(get_wo_permit_detail(drill_wo), use_container_width=True)
+            value_counts_panel("Show WO by Area Chart", filtered['maintenance_area'], default=True, title="Work Orders by Area")
+
+
+        # ----------------------------------------------------------------------
+        # ---- 5. PERMIT DASHBOARD (ENHANCED) ----
+        # ----------------------------------------------------------------------
+        elif menu == "📊 Permit Dashboard":
+            st.title("Work Permit & Efficiency Dashboard (WPR Table)")
+
+            # Load data using the cached function
+            wpr = load_wpr_data()
+
+            min_date, max_date = wpr['date'].min(), wpr['date'].max()
+            date_range = st.date_input("Date Range", [min_date, max_date], key="permit_date")
+            # H:M, rounded KPI and close-time columns come precomputed by parse_wpr_data
+            filtered = wpr
+            if len(date_range) == 2:
+                start, end = pd.to_datetime(date_range)
+                filtered = wpr[(wpr['date'] >= start) & (wpr['date'] <= end)]
 
-        min_date, max_date = wpr['date'].min(), wpr['date'].max()
-        date_range = st.date_input("Date Range", [min_date, max_date], key="permit_date")
-        filtered = wpr
+            col1, col2 = st.columns([2, 3])
 
-        filtered['Work Duration (H:M)'] = filtered['(m-l)'].apply(format_timedelta_to_h_m)
+            # ---- KPI CARDS ----
+            with col1:
+                st.metric("Total Permits Issued", len(filtered))
+                # Avg Work Duration (from m-l)
+                if filtered['work_duration'].notna().sum():
+                    st.metric("Avg Work Duration (hrs)", f"{filtered['work_duration'].mean():.2f}")
+                else:
+                    st.metric("Avg Work Duration (hrs)", "N/A")
+                # Avg Permit Cycle (from n-i)
+                if filtered['total_permit_time'].notna().sum():
+                    st.metric("Avg Permit Cycle (hrs)", f"{filtered['total_permit_time'].mean():.2f}")
+                else:
+                    st.metric("Avg Permit Cycle (hrs)", "N/A")
+                # Avg Efficiency
+                if filtered['efficiency'].notna().sum():
+                    st.metric("Avg Efficiency", f"{filtered['efficiency'].mean():.2f}")
+                else:
+                    st.metric("Avg Efficiency", "N/A")
+                # Avg Permit Close Time (from actual start/finish)
+                if not filtered['work_finish_time'].isna().all() and not filtered['work_actual_start_time'].isna().all():
+                    avg_duration = filtered['duration'].mean()
+                    st.metric("Avg Permit Close Time (hrs)", f"{avg_duration:.2f}" if pd.notnull(avg_duration) else "N/A")
+                else:
+                    st.metric("Avg Permit Close Time (hrs)", "N/A")
 
-        # 2. Format the (n-i) column (Permit Cycle Time)
-        filtered['Permit Cycle (H:M)'] = filtered['(n-i)'].apply(format_timedelta_to_h_m)
+            with col2:
+                permit_breakdown_panel(filtered)
 
-        # 3. Optional: Format the efficiency percentage to two decimals (if it's not already)
         
-
-        # filtering the decimals
-        # filtering the decimals - ensure they are float first
-        for col in ["work_duration", "total_permit_time", "efficiency"]:
-            filtered[col] = pd.to_numeric(filtered[col], errors='coerce')
+            # 🚨 ENHANCEMENT: Efficiency Scatter Plot (FIXED)
+            st.subheader("Efficiency vs Permit Times (Outlier Detection)")
         
-        filtered["work_duration"] = filtered["work_duration"].round(2)
-        filtered["total_permit_time"] = filtered["total_permit_time"].round(2)
-        filtered["efficiency"] = filtered["efficiency"].round(2)
-        filtered['Efficiency (%)'] = filtered['efficiency']
-
+            scatter_data = filtered.loc[
+                (filtered['work_duration'].notna()) &
+                (filtered['total_permit_time'].notna()) &
+                (filtered['work_duration'] > 0) &
+                (filtered['total_permit_time'] > 0),
+                ['wo_number', 'permit_number', 'work_duration', 'total_permit_time', 'efficiency']
+            ].rename(columns={'work_duration': 'Work Duration (m-l)', 'total_permit_time': 'Total Permit Time (n-i)'})
         
-        filtered.drop(columns=['duration'], errors='ignore', inplace=True) # same as work_duration 
-
-        print(filtered.columns.tolist())
-
-
-        if len(date_range) == 2:
-            start, end = pd.to_datetime(date_range)
-            filtered = wpr[(wpr['date'] >= start) & (wpr['date'] <= end)]
-
-        col1, col2 = st.columns([2, 3])
-
-        # ---- KPI CARDS ----
-        with col1:
-            st.metric("Total Permits Issued", len(filtered))
-            # Avg Work Duration (from m-l)
-            if filtered['work_duration'].notna().sum():
-                st.metric("Avg Work Duration (hrs)", f"{filtered['work_duration'].mean():.2f}")
-            else:
-                st.metric("Avg Work Duration (hrs)", "N/A")
-            # Avg Permit Cycle (from n-i)
-            if filtered['total_permit_time'].notna().sum():
-                st.metric("Avg Permit Cycle (hrs)", f"{filtered['total_permit_time'].mean():.2f}")
-            else:
-                st.metric("Avg Permit Cycle (hrs)", "N/A")
-            # Avg Efficiency
-            if filtered['efficiency'].notna().sum():
-                st.metric("Avg Efficiency", f"{filtered['efficiency'].mean():.2f}")
-            else:
-                st.metric("Avg Efficiency", "N/A")
-            # Avg Permit Close Time (from actual start/finish)
-            if not filtered['work_finish_time'].isna().all() and not filtered['work_actual_start_time'].isna().all():
-                filtered['duration'] = (filtered['work_finish_time'] - filtered['work_actual_start_time']).dt.total_seconds() / 3600
-                avg_duration = filtered['duration'].mean()
-                st.metric("Avg Permit Close Time (hrs)", f"{avg_duration:.2f}" if pd.notnull(avg_duration) else "N/A")
-            else:
-                st.metric("Avg Permit Close Time (hrs)", "N/A")
-
-        with col2:
-            # ENHANCEMENT: Toggle for RTM/Plant vs Crew
-            chart_selection = st.radio(
-                "Permit Breakdown By:",
-                ("Plant/RTM Number", "Crew Members"),
-                horizontal=True
-            )
-            st.subheader(f"Permits by {chart_selection}")
-            
-            if chart_selection == "Plant/RTM Number" and 'plant/rtm_no' in filtered.columns:
-                st.bar_chart(filtered['plant/rtm_no'].value_counts().head(10), use_container_width=True)
-            elif chart_selection == "Crew Members" and 'crew_members' in filtered.columns:
-                st.bar_chart(filtered['crew_members'].value_counts().head(10), use_container_width=True)
+            if len(scatter_data) > 5:
+                # The check 'if 'altair' in globals()' is removed, 
+                # as it was causing the misleading error message.
+                chart = alt.Chart(scatter_data).mark_circle().encode(
+                    x=alt.X('Total Permit Time (n-i)', title='Total Permit Time (hrs)', scale=alt.Scale(type="log")),
+                    y=alt.Y('Work Duration (m-l)', title='Work Duration (hrs)', scale=alt.Scale(type="log")),
+                    color=alt.Color('efficiency', scale=alt.Scale(domain=[0, 50, 100], range=['red', 'yellow', 'green'], type="linear"), title="Efficiency"),
+                    tooltip=['wo_number', 'permit_number', 'Work Duration (m-l)', 'Total Permit Time (n-i)', alt.Tooltip('efficiency', format='.2f')]
+                ).properties(
+                    title='Permit Efficiency Scatter Plot (Log Scale)'
+                ).interactive()
+                st.altair_chart(chart, use_container_width=True)
+                st.caption("Lower left (low time investment, high efficiency) is optimal. Hover for details.")
             else:
-                st.info(f"Column '{'plant/rtm_no' if chart_selection == 'Plant/RTM Number' else 'crew_members'}' not available or empty.")
-
-        
-        # 🚨 ENHANCEMENT: Efficiency Scatter Plot (FIXED)
-        st.subheader("Efficiency vs Permit Times (Outlier Detection)")
-        
-        scatter_data = filtered.copy()
-        print(scatter_data)
-        scatter_data = scatter_data[
-            (scatter_data['work_duration'].notna()) & 
-            (scatter_data['total_permit_time'].notna()) &
-            (scatter_data['work_duration'] > 0) & 
-            (scatter_data['total_permit_time'] > 0)
-        ].rename(columns={'work_duration': 'Work Duration (m-l)', 'total_permit_time': 'Total Permit Time (n-i)'})
-        
-        if len(scatter_data) > 5:
-            # The check 'if 'altair' in globals()' is removed, 
-            # as it was causing the misleading error message.
-            chart = alt.Chart(scatter_data).mark_circle().encode(
-                x=alt.X('Total Permit Time (n-i)', title='Total Permit Time (hrs)', scale=alt.Scale(type="log")),
-                y=alt.Y('Work Duration (m-l)', title='Work Duration (hrs)', scale=alt.Scale(type="log")),
-                color=alt.Color('efficiency', scale=alt.Scale(domain=[0, 50, 100], range=['red', 'yellow', 'green'], type="linear"), title="Efficiency"),
-                tooltip=['wo_number', 'permit_number', 'Work Duration (m-l)', 'Total Permit Time (n-i)', alt.Tooltip('efficiency', format='.2f')]
-            ).properties(
-                title='Permit Efficiency Scatter Plot (Log Scale)'
-            ).interactive()
-            st.altair_chart(chart, use_container_width=True)
-            st.caption("Lower left (low time investment, high efficiency) is optimal. Hover for details.")
-        else:
-            st.info("Not enough valid data points to plot the Efficiency Scatter Plot.")
-
-
-        # 🚨 ENHANCEMENT: Time-Loss Breakdown (KPI Display)
-        st.subheader("Average Permit Phase Time Breakdown")
-        breakdown_data = {
-            "Phase": ["Avg Work Duration (m-l)", "Avg Permit Cycle (n-i)"],
-            "Time (Hours)": [
-                filtered['work_duration'].mean(),
-                filtered['total_permit_time'].mean()
-            ]
-        }
+                st.info("Not enough valid data points to plot the Efficiency Scatter Plot.")
+
+
+            # 🚨 ENHANCEMENT: Time-Loss Breakdown (KPI Display)
+            st.subheader("Average Permit Phase Time Breakdown")
+            breakdown_data = {
+                "Phase": [
+                    "Request → SWP Prep", "SWP Prep → Issuance", "Issuance → Work Start",
+                    "Avg Work Duration (m-l)", "Work Finish → SWP Close", "Avg Permit Cycle (n-i)"
+                ],
+                "Time (Hours)": [
+                    filtered['request_to_prep'].mean() / pd.Timedelta(hours=1),
+                    filtered['prep_to_issuance'].mean() / pd.Timedelta(hours=1),
+                    filtered['issuance_to_start'].mean() / pd.Timedelta(hours=1),
+                    filtered['work_duration'].mean(),
+                    filtered['finish_to_close'].mean() / pd.Timedelta(hours=1),
+                    filtered['total_permit_time'].mean()
+                ]
+            }
         
-        breakdown_df = pd.DataFrame(breakdown_data).set_index("Phase").dropna()
-        if not breakdown_df.empty:
-            st.dataframe(breakdown_df.style.format(precision=2), use_container_width=True)
-            st.caption("This shows the average time spent in the two main phases: the actual work (duration) and the permit issuance/closure (cycle).")
+            breakdown_df = pd.DataFrame(breakdown_data).set_index("Phase").dropna()
+            if not breakdown_df.empty:
+                st.dataframe(breakdown_df.style.format(precision=2), use_container_width=True)
+                st.caption("Average time in each permit phase, from request to SWP closing. The last row is the end-to-end permit cycle.")
         
-        # ---- Efficiency Trend Toggle ----
-        show_trend = st.checkbox("Show Efficiency Trend Over Time", value=False)
-        if show_trend:
-            st.subheader("Efficiency Trend Over Time")
-            eff_trend = filtered.set_index('date').resample('D')['efficiency'].mean().dropna()
-            st.line_chart(eff_trend, use_container_width=True)
-
-        st.write("### Permit Table")
-        st.dataframe(
-                    filtered[[
-                        'receiver_name', 
-                        'position', 
-                        'date', 
-                        'crew_members', 
-                        'wo_number', 
-                        'wo_description', 
-                        'permit_number', 
-                        'plant/rtm_no', 
-                        'time_of_requesting_permit', 
-                        'time_of_issuer_starting_swp_preperation', 
-                        'time_of_permit_issuance', 
-                        'work_actual_start_time', 
-                        'work_finish_time', 
-                        'swp_closing_time', 
-                        'remarks', 
-                        'Work Duration (H:M)', 
-                        'Permit Cycle (H:M)', 
-                        'Efficiency (%)'
-                    ]],
-                    width='stretch')
-
-
-
-    # ----------------------------------------------------------------------
-    # ---- 6. QC DASHBOARD (UNCHANGED) ----
-    # ----------------------------------------------------------------------
-    elif menu == "📊 QC Dashboard":
-        st.title("Quality Control (QC) Activities Dashboard")
-        # ... (rest of QC Dashboard code remains here) ...
-        qc = get_table("qc_activities")
-        qc['report_date'] = pd.to_datetime(qc['report_date'], errors='coerce')
-
-        with st.expander("🔎 Filter Records", expanded=False):
-            col1, col2, col3, col4 = st.columns(4)
-
-            min_date, max_date = qc['report_date'].min(), qc['report_date'].max()
-            date_range = col1.date_input("Date Range", [min_date, max_date], key="qc_date")
-
-            areas = sorted(qc['area'].dropna().unique())
-            area_select = col2.multiselect("Area", areas, default=None)
-
-            statuses = sorted(qc['status'].dropna().unique())
-            status_select = col3.multiselect("Status", statuses, default=None)
-
-            sections = sorted(qc['section'].dropna().unique()) if 'section' in qc.columns else []
-            section_select = col4.multiselect("Section", sections, default=None)
-
-            filtered_qc = qc.copy()
-            if len(date_range) == 2:
-                start, end = [pd.to_datetime(d) for d in date_range]
-                filtered_qc = filtered_qc[(filtered_qc['report_date'] >= start) & (filtered_qc['report_date'] <= end)]
-            if area_select:
-                filtered_qc = filtered_qc[filtered_qc['area'].isin(area_select)]
-            if status_select:
-                filtered_qc = filtered_qc[filtered_qc['status'].isin(status_select)]
-            if section_select:
-                filtered_qc = filtered_qc[filtered_qc['section'].isin(section_select)]
-
-            filter_linked = st.checkbox("Show only QC linked to WO and Permit", value=False)
-            filtered_qc['linked_to_wo'] = filtered_qc['wo_number'].notna() & (filtered_qc['wo_number'] != "")
-            filtered_qc['linked_to_permit'] = filtered_qc['wo_number'].isin(get_table('WPR')['wo_number'].dropna().unique())
-            if filter_linked:
-                filtered_qc = filtered_qc[filtered_qc['linked_to_wo'] & filtered_qc['linked_to_permit']]
-
-            st.write(f"Filtered records: **{len(filtered_qc)}**")
-            st.dataframe(filtered_qc, use_container_width=True) 
-
-        # ---- KPIs and Charts ----
-        col1, col2 = st.columns(2)
-        with col1:
-            st.metric("Total QC Activities", len(filtered_qc))
-            st.metric("QC Linked to WO", filtered_qc['linked_to_wo'].sum())
-            st.metric("QC Linked to Permit", filtered_qc['linked_to_permit'].sum())
-            st.write("### QC Linked to Permit")
-            st.bar_chart(filtered_qc['linked_to_permit'].value_counts(), use_container_width=True)
-        with col2:
-            if st.checkbox("Show QC linked to WO", value=False):
-                st.write("### Linked vs Unlinked (QC to WO)")
-                st.bar_chart(filtered_qc['linked_to_wo'].value_counts(), use_container_width=True)
-
-        # ---- More Analytics ----
-        if st.checkbox("Show Top Work Types (scope_of_work)", value=False):
-            st.subheader("Top Work Types")
-            top_scope = filtered_qc['scope_of_work'].value_counts().head(10)
-            st.bar_chart(top_scope, use_container_width=True)
-            
-        if st.checkbox("Show Most Common Procedures Used", value=False):
-            st.subheader("Most Common Procedures Used")
-            top_proc = filtered_qc['work_procedure_use'].value_counts().head(10)
-            st.bar_chart(top_proc, use_container_width=True)
-
-        if st.checkbox("Show Work Types by Area", value=False):
-            st.subheader("Work Types by Area")
-            if 'area' in filtered_qc.columns:
-                area_counts = filtered_qc.groupby('area')['scope_of_work'].count()
-                st.bar_chart(area_counts, use_container_width=True)
-
-    # ----------------------------------------------------------------------
-    # ---- 7. PATROL DASHBOARD (UNCHANGED) ----
-    # ----------------------------------------------------------------------
-    elif menu == "📊 Safety Dashboard":
-        st.title("Daily Safety Patrol Dashboard")
-        patrol = get_table("daily_safety_patrol")
-        patrol['report_date'] = pd.to_datetime(patrol['report_date'], errors='coerce')
-
-        with st.expander("🔎 Filter Records", expanded=False):
-            col1, col2, col3, col4 = st.columns(4)
-
-            min_date, max_date = patrol['report_date'].min(), patrol['report_date'].max()
-            date_range = col1.date_input("Date Range", [min_date, max_date], key="patrol_date")
+            # ---- Efficiency Trend Toggle ----
+            efficiency_trend_panel(filtered)
+
+            st.write("### Permit Table")
+            permit_range = date_range if len(date_range) == 2 else None
+            paged_table(
+                "wpr_table", WPR_DURATIONS_VIEW, permit_range,
+                sort_options=["date", "permit_number", "wo_number", "efficiency", "work_hours", "permit_cycle_hours"],
+                prepare=format_permit_page,
+            )
 
-            areas = sorted(patrol['area'].dropna().unique())
-            area_select = col2.multiselect("Area", areas, default=None)
 
-            statuses = sorted(patrol['status'].dropna().unique()) if 'status' in patrol.columns else []
-            status_select = col3.multiselect("Status", statuses, default=None)
 
-            types = sorted(patrol['type'].dropna().unique()) if 'type' in patrol.columns else []
-            type_select = col4.multiselect("Type", types, default=None)
+        # ----------------------------------------------------------------------
+        # ---- 6. QC DASHBOARD (UNCHANGED) ----
+        # ----------------------------------------------------------------------
+        elif menu == "📊 QC Dashboard":
+            st.title("Quality Control (QC) Activities Dashboard")
+            # ... (rest of QC Dashboard code remains here) ...
+            qc = load_page_table("qc_activities")
+
+            with st.expander("🔎 Filter Records", expanded=False):
+                col1, col2, col3, col4 = st.columns(4)
+
+                min_date, max_date = qc['report_date'].min(), qc['report_date'].max()
+                date_range = col1.date_input("Date Range", [min_date, max_date], key="qc_date")
+
+                areas = sorted(qc['area'].dropna().unique())
+                area_select = col2.multiselect("Area", areas, default=None)
+
+                statuses = sorted(qc['status'].dropna().unique())
+                status_select = col3.multiselect("Status", statuses, default=None)
+
+                sections = sorted(qc['section'].dropna().unique()) if 'section' in qc.columns else []
+                section_select = col4.multiselect("Section", sections, default=None)
+
+                qc_range = date_range if len(date_range) == 2 else None
+                qc_filters = {"area": area_select, "status": status_select, "section": section_select}
+                filtered_qc = qc
+                if len(date_range) == 2:
+                    start, end = [pd.to_datetime(d) for d in date_range]
+                    filtered_qc = filtered_qc[(filtered_qc['report_date'] >= start) & (filtered_qc['report_date'] <= end)]
+                if area_select:
+                    filtered_qc = filtered_qc[filtered_qc['area'].isin(area_select)]
+                if status_select:
+                    filtered_qc = filtered_qc[filtered_qc['status'].isin(status_select)]
+                if section_select:
+                    filtered_qc = filtered_qc[filtered_qc['section'].isin(section_select)]
+
+                filter_linked = st.checkbox("Show only QC linked to WO and Permit", value=False)
+                # 🚨 Permit links come from the shared WPR link index; the filter itself is an EXISTS in SQL
+                linked_to_wo = filtered_qc['wo_number'].notna() & (filtered_qc['wo_number'] != "")
+                linked_to_permit = permit_links(filtered_qc['wo_number']) > 0
+                if filter_linked:
+                    qc_filters["wo_number"] = LINKED_TO_PERMIT
+                    keep = linked_to_wo & linked_to_permit
+                    filtered_qc, linked_to_wo, linked_to_permit = filtered_qc[keep], linked_to_wo[keep], linked_to_permit[keep]
+
+                st.write(f"Filtered records: **{len(filtered_qc)}**")
+                qc_sort = ["report_date", "area", "status", "section", "wo_number"]
+                paged_table(
+                    "qc_table", "qc_activities", qc_range, qc_filters, qc_sort,
+                    prepare=lambda page: page.assign(
+                        linked_to_wo=page['wo_number'].notna() & (page['wo_number'] != ""),
+                        linked_to_permit=permit_links(page['wo_number']) > 0,
+                    ),
+                )
+
+            # ---- KPIs and Charts ----
+            col1, col2 = st.columns(2)
+            with col1:
+                st.metric("Total QC Activities", len(filtered_qc))
+                st.metric("QC Linked to WO", linked_to_wo.sum())
+                st.metric("QC Linked to Permit", linked_to_permit.sum())
+                st.write("### QC Linked to Permit")
+                st.bar_chart(linked_to_permit.value_counts(), use_container_width=True)
+            with col2:
+                value_counts_panel("Show QC linked to WO", linked_to_wo, title="Linked vs Unlinked (QC to WO)")
 
-            filtered_patrol = patrol.copy()
-            if len(date_range) == 2:
-                start, end = [pd.to_datetime(d) for d in date_range]
-                filtered_patrol = filtered_patrol[(filtered_patrol['report_date'] >= start) & (filtered_patrol['report_date'] <= end)]
-            if area_select:
-                filtered_patrol = filtered_patrol[filtered_patrol['area'].isin(area_select)]
-            if status_select:
-                filtered_patrol = filtered_patrol[filtered_patrol['status'].isin(status_select)]
-            if type_select:
-                filtered_patrol = filtered_patrol[filtered_patrol['type'].isin(type_select)]
-
-            # Add permit link column and filter
-            filtered_patrol['linked_to_permit'] = filtered_patrol['permit_no'].notna() & (filtered_patrol['permit_no'] != "")
-            show_linked = st.checkbox("Show Only Patrols Linked to Permit", value=False)
-            if show_linked:
-                filtered_patrol = filtered_patrol[filtered_patrol['linked_to_permit']]
-
-            # ---- Patrol Summary & Bar Chart in expander ----
-            colA, colB = st.columns([2, 2])
-            with colA:
-                st.metric("Total Patrols", len(filtered_patrol))
-                st.metric("Patrols Linked to Permit", filtered_patrol['linked_to_permit'].sum())
-                st.metric("Patrols Without Permit", (~filtered_patrol['linked_to_permit']).sum())
-            with colB:
-                st.write("### Linked to Permit?")
-                st.bar_chart(filtered_patrol['linked_to_permit'].value_counts(), use_container_width=True)
-
-            st.write(f"Filtered records: **{len(filtered_patrol)}**")
-            # Fixed width
-            st.dataframe(filtered_patrol, use_container_width=True)
-
-        # --- CHARTS OUTSIDE EXPANDER START HERE ---
-
-        if st.checkbox("Show 'Most Common Actions Taken' Chart", value=False):
-            st.subheader("Most Common Actions Taken")
-            st.bar_chart(filtered_patrol['action'].value_counts().head(10), use_container_width=True)
-
-        if st.checkbox("Show 'Most Common Patrol Types' Chart", value=False):
-            st.subheader("Most Common Patrol Types")
-            st.bar_chart(filtered_patrol['type'].value_counts().head(10), use_container_width=True)
-
-        if st.checkbox("Show 'Patrols per Area' Chart", value=True):
-            st.subheader("### Patrols per Area")
-            st.bar_chart(filtered_patrol['area'].value_counts(), use_container_width=True)
-
-        if st.checkbox("Show 'By Status' Chart", value=True):
-                if 'status' in filtered_patrol.columns:
-                    st.write("### By Status")
-                    st.bar_chart(filtered_patrol['status'].value_counts(), use_container_width=True)
+            # ---- More Analytics (each panel reruns on its own) ----
+            counts_panel("Show Top Work Types (scope_of_work)", "qc_activities", "scope_of_work", qc_range, qc_filters, title="Top Work Types", limit=10)
+            counts_panel("Show Most Common Procedures Used", "qc_activities", "work_procedure_use", qc_range, qc_filters, limit=10, title="Most Common Procedures Used")
+            if 'area' in filtered_qc.columns:
+                counts_panel(
+                    "Show Work Types by Area", "qc_activities", "area", qc_range, qc_filters,
+                    title="Work Types by Area", count_column="scope_of_work", sort="value",
+                )
+
+        # ----------------------------------------------------------------------
+        # ---- 7. PATROL DASHBOARD (UNCHANGED) ----
+        # ----------------------------------------------------------------------
+        elif menu == "📊 Safety Dashboard":
+            st.title("Daily Safety Patrol Dashboard")
+            patrol = load_page_table("daily_safety_patrol")
+
+            with st.expander("🔎 Filter Records", expanded=False):
+                col1, col2, col3, col4 = st.columns(4)
+
+                min_date, max_date = patrol['report_date'].min(), patrol['report_date'].max()
+                date_range = col1.date_input("Date Range", [min_date, max_date], key="patrol_date")
+
+                areas = sorted(patrol['area'].dropna().unique())
+                area_select = col2.multiselect("Area", areas, default=None)
+
+                statuses = sorted(patrol['status'].dropna().unique()) if 'status' in patrol.columns else []
+                status_select = col3.multiselect("Status", statuses, default=None)
+
+                types = sorted(patrol['type'].dropna().unique()) if 'type' in patrol.columns else []
+                type_select = col4.multiselect("Type", types, default=None)
+
+                patrol_range = date_range if len(date_range) == 2 else None
+                patrol_filters = {"area": area_select, "status": status_select, "type": type_select}
+                filtered_patrol = patrol
+                if len(date_range) == 2:
+                    start, end = [pd.to_datetime(d) for d in date_range]
+                    filtered_patrol = filtered_patrol[(filtered_patrol['report_date'] >= start) & (filtered_patrol['report_date'] <= end)]
+                if area_select:
+                    filtered_patrol = filtered_patrol[filtered_patrol['area'].isin(area_select)]
+                if status_select:
+                    filtered_patrol = filtered_patrol[filtered_patrol['status'].isin(status_select)]
+                if type_select:
+                    filtered_patrol = filtered_patrol[filtered_patrol['type'].isin(type_select)]
+
+                # Add permit link column and filter: the permit number must exist in WPR, not just be filled in
+                linked_to_permit = permit_links(filtered_patrol['permit_no'], kind="permit") > 0
+                show_linked = st.checkbox("Show Only Patrols Linked to Permit", value=False)
+                if show_linked:
+                    patrol_filters["permit_no"] = LINKED_TO_PERMIT
+                    filtered_patrol, linked_to_permit = filtered_patrol[linked_to_permit], linked_to_permit[linked_to_permit]
+
+                # ---- Patrol Summary & Bar Chart in expander ----
+                colA, colB = st.columns([2, 2])
+                with colA:
+                    st.metric("Total Patrols", len(filtered_patrol))
+                    st.metric("Patrols Linked to Permit", linked_to_permit.sum())
+                    st.metric("Patrols Without Permit", (~linked_to_permit).sum())
+                with colB:
+                    st.write("### Linked to Permit?")
+                    st.bar_chart(linked_to_permit.value_counts(), use_container_width=True)
+
+                st.write(f"Filtered records: **{len(filtered_patrol)}**")
+                patrol_sort = ["report_date", "area", "status", "type", "permit_no"]
+                paged_table(
+                    "patrol_table", "daily_safety_patrol", patrol_range, patrol_filters, patrol_sort,
+                    prepare=lambda page: page.assign(linked_to_permit=permit_links(page['permit_no'], kind="permit") > 0),
+                )
+
+            # --- CHARTS OUTSIDE EXPANDER START HERE (each panel reruns on its own) ---
+            counts_panel("Show 'Most Common Actions Taken' Chart", "daily_safety_patrol", "action", patrol_range, patrol_filters, title="Most Common Actions Taken", limit=10)
+            counts_panel("Show 'Most Common Patrol Types' Chart", "daily_safety_patrol", "type", patrol_range, patrol_filters, title="Most Common Patrol Types", limit=10)
+            counts_panel("Show 'Patrols per Area' Chart", "daily_safety_patrol", "area", patrol_range, patrol_filters, default=True, title="Patrols per Area")
+            if 'status' in filtered_patrol.columns:
+                counts_panel("Show 'By Status' Chart", "daily_safety_patrol", "status", patrol_range, patrol_filters, default=True, title="By Status")
+
+
+        # ----------------------------------------------------------------------
+        # ---- 8. FULL-TEXT SEARCH (GIN-indexed, nothing loaded into pandas) ----
+        # ----------------------------------------------------------------------
+        elif menu == "🔍 Search Records":
+            st.title("Search Observations & Findings")
+            st.caption('Web-style syntax: `"pump seal"` matches the phrase, `-gasket` excludes a word, `or` gives alternatives.')
+
+            labels = {"maintenance_reports": "Maintenance", "qc_activities": "QC", "daily_safety_patrol": "Safety Patrol"}
+            c1, c2, c3 = st.columns([3, 2, 1])
+            query = c1.text_input("Search")
+            sources = c2.multiselect("Search in", list(labels), default=list(labels), format_func=labels.get)
+            page_size = c3.selectbox("Per page", [10, 20, 50], index=1)
+
+            if query.strip() and sources:
+                started = time.perf_counter()
+                matches = count_search_matches(query, sources)
+                total = int(matches.sum())
+                pages = max(1, -(-total // page_size))
+                page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=f"search_page_{query}")
+                results = search_records(query, sources, page, page_size)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+
+                st.write(f"**{total}** matches — " + ", ".join(f"{labels[src]}: {n}" for src, n in matches.items()))
+                st.caption(f"Ranked by relevance · {elapsed_ms:.0f} ms")
+                for hit in results.itertuples():
+                    day = pd.to_datetime(hit.day).strftime("%Y-%m-%d") if pd.notna(hit.day) else "no date"
+                    st.markdown(f"**{labels[hit.source]}** · {day} · {hit.area or '—'} · {hit.ref or '—'}  \n{hit.snippet}")
+            elif not sources:
+                st.info("Pick at least one record type to search.")
+    finally:
+        # st.stop() and exceptions end the run here too
+        st.session_state["page_running"] = False
+        log_latency("page", menu, page_started)
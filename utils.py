@@ -1,91 +1,1544 @@
+import numpy as np
 import pandas as pd
 import psycopg2
+from psycopg2 import pool as pg_pool, sql
+from psycopg2.extras import execute_values
 import streamlit as st
+import datetime
+import functools
+import hashlib
+import inspect
+import io
+import json
 import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 
+# ----------------------------------------------------------------------
+# CONNECTION POOL (one per Streamlit process, shared by every session)
+# ----------------------------------------------------------------------
+_POOL = None
+_POOL_SLOTS = None
+_POOL_LOCK = threading.Lock()
+_LAST_RETURNED = {}
+_POOL_STATS = {"checkouts": 0, "in_use": 0, "peak_in_use": 0, "reconnects": 0, "wait_seconds": 0.0}
+
+def _pool_settings():
+    """Pool sizing from the vault; only `url` is mandatory under [database]."""
+    cfg = st.secrets["database"]
+    return {
+        "url": cfg["url"],
+        "min": int(cfg.get("pool_min", 1)),
+        "max": int(cfg.get("pool_max", 10)),
+        "check_after": float(cfg.get("pool_check_after", 30)),  # idle seconds before a SELECT 1 probe
+        "timeout": float(cfg.get("pool_timeout", 30)),          # seconds to wait for a free slot
+    }
+
+def _get_pool():
+    global _POOL, _POOL_SLOTS
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                cfg = _pool_settings()
+                _POOL_SLOTS = threading.BoundedSemaphore(cfg["max"])
+                _POOL = pg_pool.ThreadedConnectionPool(cfg["min"], cfg["max"], cfg["url"])
+    return _POOL
+
+def _is_alive(conn, check_after):
+    """Cheap liveness check: only probe sockets that sat idle longer than `check_after`."""
+    if conn.closed:
+        return False
+    if time.monotonic() - _LAST_RETURNED.get(id(conn), 0) < check_after:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        return False
+
+@contextmanager
 def get_connection():
-    """Retrieve the Frankfurt URI from the secure Streamlit vault."""
-    return psycopg2.connect(st.secrets["database"]["url"])
+    """Borrow a health-checked connection from the process-wide pool.
 
-def get_table(table):
-    """Fetch an entire table from the Cloud PostgreSQL vault."""
-    conn = get_connection()
+    Use as `with get_connection() as conn:`; wrap writes in `with conn:` for the
+    transaction as before. The connection goes back to the pool on exit.
+    """
+    cfg = _pool_settings()
+    pool = _get_pool()
+    started = time.monotonic()
+    if not _POOL_SLOTS.acquire(timeout=cfg["timeout"]):
+        raise pg_pool.PoolError(f"No free database connection after {cfg['timeout']:.0f}s")
+    conn = None
     try:
-        # PostgreSQL uses double quotes to ensure table names are read correctly
-        query = f'SELECT * FROM "{table}"'
-        return pd.read_sql(query, conn)
+        conn = pool.getconn()
+        # Stale socket (server restart, idle timeout, network blip): drop it and try the
+        # next one. Each pass closes an idle connection; once none are left the pool opens
+        # a fresh one, which either works or raises.
+        while not _is_alive(conn, cfg["check_after"]):
+            _LAST_RETURNED.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+            conn = None
+            conn = pool.getconn()
+            with _POOL_LOCK:
+                _POOL_STATS["reconnects"] += 1
+        with _POOL_LOCK:
+            _POOL_STATS["checkouts"] += 1
+            _POOL_STATS["in_use"] += 1
+            _POOL_STATS["peak_in_use"] = max(_POOL_STATS["peak_in_use"], _POOL_STATS["in_use"])
+            _POOL_STATS["wait_seconds"] += time.monotonic() - started
+        try:
+            yield conn
+        finally:
+            with _POOL_LOCK:
+                _POOL_STATS["in_use"] -= 1
     finally:
-        conn.close()
+        if conn is not None:
+            # putconn rolls back any open transaction and discards broken connections
+            if conn.closed:
+                _LAST_RETURNED.pop(id(conn), None)
+            else:
+                _LAST_RETURNED[id(conn)] = time.monotonic()
+            pool.putconn(conn, close=bool(conn.closed))
+        _POOL_SLOTS.release()
+
+def pool_stats():
+    """Snapshot of the pool counters for monitoring."""
+    cfg = _pool_settings()
+    with _POOL_LOCK:
+        stats = dict(_POOL_STATS)
+    stats.update({"min_size": cfg["min"], "max_size": cfg["max"]})
+    return stats
+
+# ----------------------------------------------------------------------
+# SHARED RESULT CACHE (one SQLite file for every session, process and replica)
+# ----------------------------------------------------------------------
+# Read helpers decorated with @shared_result store their DataFrame/Series as
+# Parquet, keyed by function + normalized arguments and tagged with the source
+# tables; bump_table_versions() deletes the tagged entries. The file is capped
+# at `max_mb`, evicting least recently used results first. A failing cache is a
+# miss, never an error. WAL lets the processes of one host read while another
+# writes; it needs a host-local disk, so replicas on other hosts keep their own file.
+_CACHE_STATS = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "errors": 0}
+_CACHE_LOCK = threading.Lock()
+_CACHE_READY = set()
+# Hit times are kept here and written to `accessed` in batches, so a hit is a pure read
+_CACHE_TOUCHED = {}
+_CACHE_TOUCH_EVERY = 30  # seconds between batched `accessed` writes
+_CACHE_LAST_TOUCH = 0.0
+# Views and derived tables whose cached results depend on other tables' writes
+CACHE_SOURCES = {}
+
+def _cache_settings():
+    """[result_cache] in .streamlit/secrets.toml; every key is optional."""
+    cfg = st.secrets.get("result_cache", {})
+    return {
+        "path": cfg.get("path", os.path.join(".cache", "query_results.sqlite")),
+        "max_bytes": int(float(cfg.get("max_mb", 256)) * 1024 * 1024),
+        "ttl": float(cfg.get("ttl", 900)),  # seconds; bounds staleness from writes made outside the app
+        "enabled": bool(cfg.get("enabled", True)),
+    }
 
-def get_wo_permit_overview():
-    """Unified view for the Overview Dashboard using Cloud PostgreSQL."""
-    conn = get_connection()
+@contextmanager
+def _cache_db(path):
+    """Short-lived SQLite connection to the cache file, committed and closed on exit."""
+    if path not in _CACHE_READY:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    con = sqlite3.connect(path, timeout=5)
+    if path not in _CACHE_READY:
+        con.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY, kind TEXT, payload BLOB, bytes INTEGER, created REAL, accessed REAL
+            );
+            CREATE TABLE IF NOT EXISTS result_tags (tag TEXT, key TEXT, PRIMARY KEY (tag, key));
+            CREATE INDEX IF NOT EXISTS idx_results_accessed ON results(accessed);
+        """)
+        _CACHE_READY.add(path)
     try:
-        # 🚨 FIX: Using the Full-Width Hash "＃" as identified by the Postgres HINT
-        query = """
-            SELECT 
-                mr.wo_number AS maintenance_wo,
-                mr.area AS maintenance_area,
-                mr.status AS maintenance_status,
-                mr.report_date AS maintenance_report_date,
-                wpr.permit_number,
-                wpr.date AS permit_date,
-                wpr.work_actual_start_time,
-                wpr.work_finish_time,
-                wpr."(m-l)" AS work_duration,
-                wpr."(n-i)" AS total_permit_time,
-                wpr."(m-l)/(n-i)" AS efficiency,
-                qc.id AS qc_id,
-                qc.area AS qc_area,
-                qc.scope_of_work
-            FROM "maintenance_reports" mr
-            LEFT JOIN "WPR" wpr ON mr.wo_number = wpr.wo_number
-            LEFT JOIN "qc_activities" qc ON mr.wo_number = qc.wo_number
-            LEFT JOIN "MAP" m ON mr.wo_number = m."wo_＃"   -- 🚨 SWAPPED TO FULL-WIDTH ＃
-        """
-        df = pd.read_sql_query(query, conn)
+        with con:
+            yield con
+    finally:
+        con.close()
+
+def _cache_count(stat, n=1):
+    with _CACHE_LOCK:
+        _CACHE_STATS[stat] += n
+
+def _normalize(value):
+    """Arguments -> JSON-stable values: dates as ISO days, dict keys and sets sorted."""
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (set, frozenset)):
+        return sorted((_normalize(v) for v in value), key=str)
+    if isinstance(value, (list, tuple, pd.Series, pd.Index)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, (pd.Timestamp, np.datetime64, datetime.date)):
+        return _iso_date(value)
+    return _scalar(value)
+
+def _cache_key(name, arguments):
+    text = json.dumps([name, _normalize(arguments)], sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def _flush_touched(con, force=False):
+    """Write the batched hit times to `accessed`, at most every _CACHE_TOUCH_EVERY seconds unless forced."""
+    global _CACHE_LAST_TOUCH
+    with _CACHE_LOCK:
+        if not _CACHE_TOUCHED or (not force and time.monotonic() - _CACHE_LAST_TOUCH < _CACHE_TOUCH_EVERY):
+            return
+        touched = [(t, k) for k, t in _CACHE_TOUCHED.items()]
+        _CACHE_TOUCHED.clear()
+        _CACHE_LAST_TOUCH = time.monotonic()
+    con.executemany("UPDATE results SET accessed = max(accessed, ?) WHERE key = ?", touched)
+
+def _cache_get(cfg, key):
+    with _cache_db(cfg["path"]) as con:
+        row = con.execute("SELECT kind, payload, created FROM results WHERE key = ?", [key]).fetchone()
+        if row is None or time.time() - row[2] > cfg["ttl"]:
+            return None
+        with _CACHE_LOCK:
+            _CACHE_TOUCHED[key] = time.time()
+        _flush_touched(con)
+    frame = pd.read_parquet(io.BytesIO(row[1]))
+    return frame.iloc[:, 0] if row[0] == "series" else frame
+
+def _cache_put(cfg, key, value, tags):
+    kind = "series" if isinstance(value, pd.Series) else "frame"
+    buf = io.BytesIO()
+    (value.to_frame() if kind == "series" else value).to_parquet(buf)
+    payload = buf.getvalue()
+    if len(payload) > cfg["max_bytes"]:
+        return
+    now = time.time()
+    with _cache_db(cfg["path"]) as con:
+        con.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)", [key, kind, payload, len(payload), now, now])
+        con.executemany("INSERT OR IGNORE INTO result_tags VALUES (?, ?)", [(t, key) for t in tags])
+        _flush_touched(con, force=True)  # eviction below goes by `accessed`
+        total = con.execute("SELECT COALESCE(SUM(bytes), 0) FROM results").fetchone()[0]
+        if total > cfg["max_bytes"]:
+            evicted = []
+            for old_key, size in con.execute("SELECT key, bytes FROM results ORDER BY accessed"):
+                if total <= cfg["max_bytes"] * 0.9:
+                    break
+                evicted.append((old_key,))
+                total -= size
+            con.executemany("DELETE FROM results WHERE key = ?", evicted)
+            con.executemany("DELETE FROM result_tags WHERE key = ?", evicted)
+            _cache_count("evictions", len(evicted))
+    _cache_count("stores")
+
+def shared_result(tags):
+    """Decorator: serve a read helper's DataFrame/Series from the shared result cache.
+
+    `tags` is the list of source tables, or a function of the call's arguments
+    returning it; writes to any of them (bump_table_versions) drop the entry.
+    `helper.uncached(...)` reads straight from Postgres, for callers that do their
+    own freshness checks.
+    """
+    def decorate(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cfg = _cache_settings()
+            if not cfg["enabled"]:
+                return func(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            tables = tags(**bound.arguments) if callable(tags) else tags
+            tables = [s for t in tables for s in [t, *CACHE_SOURCES.get(t, [])]]
+            key = _cache_key(func.__qualname__, bound.arguments)
+            try:
+                hit = _cache_get(cfg, key)
+            except Exception:
+                _cache_count("errors")
+                hit = None
+            if hit is not None:
+                _cache_count("hits")
+                return hit
+            _cache_count("misses")
+            value = func(*args, **kwargs)
+            try:
+                _cache_put(cfg, key, value, tables)
+            except Exception:
+                _cache_count("errors")  # e.g. pyarrow missing or a column Parquet can't hold
+            return value
+        wrapper.uncached = func
+        return wrapper
+    return decorate
+
+def result_cache_invalidate(*tables):
+    """Drop every cached result tagged with one of `tables` (all processes share the file)."""
+    cfg = _cache_settings()
+    if not cfg["enabled"] or not os.path.exists(cfg["path"]):
+        return
+    try:
+        with _cache_db(cfg["path"]) as con:
+            marks = ",".join("?" * len(tables))
+            con.execute(f"DELETE FROM results WHERE key IN (SELECT key FROM result_tags WHERE tag IN ({marks}))", tables)
+            con.execute("DELETE FROM result_tags WHERE key NOT IN (SELECT key FROM results)")
+    except sqlite3.Error:
+        _cache_count("errors")
+
+def result_cache_stats():
+    """Hit/miss counters of this process plus entries and bytes in the shared file."""
+    cfg = _cache_settings()
+    with _CACHE_LOCK:
+        stats = dict(_CACHE_STATS)
+    stats.update({"entries": 0, "bytes": 0, "max_bytes": cfg["max_bytes"]})
+    if cfg["enabled"] and os.path.exists(cfg["path"]):
+        with _cache_db(cfg["path"]) as con:
+            stats["entries"], stats["bytes"] = con.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM results").fetchone()
+    return stats
+
+def _table_tag(table, filters=None, **_):
+    # A LINKED_TO_PERMIT filter reads WPR as well
+    linked = any(isinstance(v, str) and v == LINKED_TO_PERMIT for v in (filters or {}).values())
+    return [table, "WPR"] if linked else [table]
+
+# Date column each dashboard filters on, per table
+TABLE_DATE_COLUMNS = {
+    "maintenance_reports": "report_date",
+    "WPR": "date",
+    "qc_activities": "report_date",
+    "daily_safety_patrol": "report_date",
+    "MAP": "execution_date",
+}
+
+def _iso_date(d):
+    return pd.to_datetime(d).strftime("%Y-%m-%d")
+
+def _where_clause(table, date_range=None, filters=None, extra=()):
+    """Build a parameterized WHERE for a date range plus equality/IN filters.
+
+    `date_range` is a (start, end) pair, both days inclusive; either side may be None.
+    `filters` maps column -> scalar (equality) or list (IN); empty lists are ignored
+    so multiselect values can be passed straight through. LINKED_TO_PERMIT as a value
+    keeps the rows whose WO/permit number exists in WPR. `extra` holds additional
+    conditions, each a parameter-free sql object or a `(condition, params)` pair
+    whose params are bound in place.
+    """
+    conditions, params = [], []
+    for condition in extra:
+        if isinstance(condition, tuple):
+            condition, condition_params = condition
+            params.extend(condition_params)
+        conditions.append(condition)
+    if date_range:
+        start, end = date_range
+        date_col = sql.Identifier(TABLE_DATE_COLUMNS[table])
+        if start is not None:
+            conditions.append(sql.SQL("{} >= %s").format(date_col))
+            params.append(_iso_date(start))
+        if end is not None:
+            conditions.append(sql.SQL("{} < %s").format(date_col))
+            params.append(_iso_date(pd.to_datetime(end) + pd.Timedelta(days=1)))
+    for col, value in (filters or {}).items():
+        if value is None:
+            continue
+        if isinstance(value, str) and value == LINKED_TO_PERMIT:
+            conditions.append(_permit_link_exists(table, col))
+            continue
+        if isinstance(value, (list, tuple, set, pd.Series, pd.Index)):
+            values = [v for v in value if pd.notna(v)]
+            if not values:
+                continue
+            conditions.append(sql.SQL("{} = ANY(%s)").format(sql.Identifier(col)))
+            params.append(values)
+        else:
+            conditions.append(sql.SQL("{} = %s").format(sql.Identifier(col)))
+            params.append(value)
+    if not conditions:
+        return sql.SQL(""), params
+    return sql.SQL(" WHERE ") + sql.SQL(" AND ").join(conditions), params
+
+def _select_list(columns=None):
+    if not columns:
+        return sql.SQL("*")
+    return sql.SQL(", ").join(sql.Identifier(c) for c in columns)
+
+@shared_result(_table_tag)
+def get_table(table, columns=None, date_range=None, filters=None):
+    """Fetch a table from the Cloud PostgreSQL vault.
+
+    Only the requested `columns` and the rows matching `date_range` / `filters`
+    (see `_where_clause`) leave the database; with no arguments the whole table is read.
+    """
+    where, params = _where_clause(table, date_range, filters)
+    # sql.Identifier double-quotes names so "WPR" and "plant/rtm_no" are read correctly
+    query = sql.SQL("SELECT {} FROM {}").format(_select_list(columns), sql.Identifier(table)) + where
+    with get_connection() as conn:
+        return pd.read_sql(query.as_string(conn), conn, params=params)
+
+# ----------------------------------------------------------------------
+# WO -> PERMIT LINKS (one GROUP BY over WPR, shared by every page)
+# ----------------------------------------------------------------------
+# Filter value: keep rows whose WO/permit number exists in WPR (see _where_clause)
+LINKED_TO_PERMIT = "__linked_to_permit__"
+# WPR column each linkable column is matched against
+PERMIT_LINK_KEYS = {
+    "wo_number": "wo_number",
+    "maintenance_wo": "wo_number",
+    "wo_＃": "wo_number",
+    "permit_number": "permit_number",
+    "permit_no": "permit_number",
+}
+_LINK_INDEX = {}
+_LINK_LOCK = threading.Lock()
+
+def _permit_link_exists(table, column):
+    """Semi-join on the indexed WPR key column; blank numbers never match."""
+    key = sql.Identifier(PERMIT_LINK_KEYS[column])
+    return sql.SQL("""EXISTS (SELECT 1 FROM "WPR" w WHERE w.{k} = btrim({c}::text) AND w.{k} <> '')""").format(
+        k=key, c=sql.Identifier(table, column)
+    )
+
+@shared_result(["WPR"])
+def _permit_link_counts():
+    """WPR rows per WO number (kind "wo") and per permit number (kind "permit")."""
+    query = """
+        SELECT 'wo' AS kind, wo_number::text AS key, COUNT(*) AS permits
+        FROM "WPR" WHERE wo_number <> '' GROUP BY 2
+        UNION ALL
+        SELECT 'permit', permit_number::text, COUNT(*)
+        FROM "WPR" WHERE permit_number <> '' GROUP BY 2
+    """
+    with get_connection() as conn:
+        return pd.read_sql(query, conn)
+
+def permit_link_index(refresh_every=60):
+    """{"wo": permits per WO number, "permit": rows per permit number}, as hash lookups.
+
+    Built once per process and rebuilt right after `bump_table_versions("WPR")`,
+    or every `refresh_every` seconds to pick up other processes' writes.
+    """
+    version = table_version("WPR")
+    with _LINK_LOCK:
+        if _LINK_INDEX.get("version") == version and time.monotonic() - _LINK_INDEX["built"] < refresh_every:
+            return _LINK_INDEX["index"]
+        counts = _permit_link_counts()
+        index = {
+            kind: counts.loc[counts["kind"] == kind].set_index("key")["permits"].astype("int64")
+            for kind in ("wo", "permit")
+        }
+        _LINK_INDEX.update(index=index, version=version, built=time.monotonic())
+        return index
+
+def permit_links(values, kind="wo"):
+    """WPR rows per value of `values` (WO numbers, or permit numbers with kind="permit"); 0 when unlinked."""
+    keys = pd.Series(values).astype("string").str.strip()
+    return keys.map(permit_link_index()[kind]).fillna(0).astype("int64")
+
+# ----------------------------------------------------------------------
+# KEYSET PAGINATION (table views fetch one page, however deep)
+# ----------------------------------------------------------------------
+@shared_result(_table_tag)
+def get_table_page(table, columns=None, date_range=None, filters=None, sort=None, descending=False,
+                   after=None, page_size=50, key="id"):
+    """One page of a table view, ordered by `sort` (NULLS LAST) then `key`.
+
+    `after` is the (sort value, key) of the last row of the previous page, or None
+    for the first page. The cursor becomes a WHERE condition instead of an OFFSET,
+    so every page reads only `page_size` rows. `sort` defaults to the table's date column.
+    """
+    sort = sort or TABLE_DATE_COLUMNS.get(table, key)
+    if columns:
+        columns = [*columns, *[c for c in (sort, key) if c not in columns]]
+    col, k = sql.Identifier(sort), sql.Identifier(key)
+    op = sql.SQL("<" if descending else ">")
+    direction = sql.SQL("DESC" if descending else "ASC")
+    cursor = []
+    if after is not None:
+        value, last = (_db_value(v) for v in after)
+        if value is None:
+            # Already inside the NULLS LAST tail: only the key moves on
+            cursor.append((sql.SQL("({c} IS NULL AND {k} {op} %s)").format(c=col, k=k, op=op), [last]))
+        else:
+            cursor.append((
+                sql.SQL("({c} {op} %s OR ({c} = %s AND {k} {op} %s) OR {c} IS NULL)").format(c=col, k=k, op=op),
+                [value, value, last],
+            ))
+    where, params = _where_clause(table, date_range, filters, extra=cursor)
+    query = sql.SQL("SELECT {cols} FROM {t}{where} ORDER BY {c} {d} NULLS LAST, {k} {d} LIMIT {n}").format(
+        cols=_select_list(columns), t=sql.Identifier(table), where=where, c=col, k=k, d=direction,
+        n=sql.Literal(int(page_size)),
+    )
+    with get_connection() as conn:
+        return pd.read_sql(query.as_string(conn), conn, params=params)
+
+def count_rows(table, date_range=None, filters=None):
+    """Row count behind a table view's pager; answered from kpi_daily when the filters allow."""
+    counted = sql.SQL("COUNT(*)")
+    dims = _kpi_dimensions(table, list(filters or {}))
+    if dims is not None:
+        filters = {**{dims[c]: v for c, v in (filters or {}).items()}, "source_table": table}
+        table, counted = KPI_TABLE, sql.SQL("COALESCE(SUM(row_count), 0)")
+    where, params = _where_clause(table, date_range, filters)
+    query = sql.SQL("SELECT {} FROM {}").format(counted, sql.Identifier(table)) + where
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(query, params)
+            return int(cur.fetchone()[0])
+
+# ----------------------------------------------------------------------
+# STREAMING READS (server-side cursor, bounded client memory)
+# ----------------------------------------------------------------------
+def iter_table_chunks(table, columns=None, date_range=None, filters=None, chunksize=50_000, dtypes=None):
+    """Yield `table` as DataFrames of at most `chunksize` rows from a named cursor.
+
+    Postgres keeps the result set server-side and ships one chunk per round trip, so
+    memory stays bounded by the chunk size. `dtypes` (column -> dtype) is applied
+    to every chunk so they concatenate and reduce consistently.
+    """
+    where, params = _where_clause(table, date_range, filters)
+    query = sql.SQL("SELECT {} FROM {}").format(_select_list(columns), sql.Identifier(table)) + where
+    with get_connection() as conn:
+        # Named cursors only live inside a transaction; the pool rolls it back on return
+        with conn.cursor(name=f"stream_{table}_{threading.get_ident()}") as cur:
+            cur.itersize = chunksize
+            cur.execute(query, params)
+            names = None
+            while True:
+                rows = cur.fetchmany(chunksize)
+                if names is None and cur.description:
+                    names = [d[0] for d in cur.description]
+                if not rows:
+                    break
+                chunk = pd.DataFrame.from_records(rows, columns=names)
+                if dtypes:
+                    chunk = chunk.astype({c: t for c, t in dtypes.items() if c in chunk.columns})
+                yield chunk
+
+def reduce_chunks(chunks, func, initial):
+    """Fold DataFrame chunks into an accumulator: `acc = func(acc, chunk)` per chunk.
+
+    Example, counts per area over the whole table without loading it:
+        reduce_chunks(iter_table_chunks("MAP", ["area"]),
+                      lambda acc, c: acc.add(c["area"].value_counts(), fill_value=0),
+                      pd.Series(dtype="float64"))
+    """
+    acc = initial
+    for chunk in chunks:
+        acc = func(acc, chunk)
+    return acc
+
+def export_chunks_csv(chunks, path_or_buf):
+    """Write DataFrame chunks to one CSV (header once) without holding them all in memory."""
+    header = True
+    for chunk in chunks:
+        chunk.to_csv(path_or_buf, mode="w" if header else "a", header=header, index=False)
+        header = False
+
+# ----------------------------------------------------------------------
+# TYPED BULK READS (COPY ... TO STDOUT into pandas with declared dtypes)
+# ----------------------------------------------------------------------
+# Every column is TEXT in the schema; these are the types the dashboards actually
+# use. "datetime" -> datetime64, "hours" -> float hours (durations), "float" ->
+# float64, "timedelta" -> timedelta64 (intervals), "category" -> pandas category
+# for low-cardinality columns.
+TABLE_DTYPES = {
+    "maintenance_reports": {
+        "report_date": "datetime", "date": "datetime",
+        "area": "category", "unit": "category", "status": "category", "section": "category",
+    },
+    "WPR": {
+        "date": "datetime", "(m-l)": "hours", "(n-i)": "hours", "(m-l)/(n-i)": "float",
+        "position": "category", "plant/rtm_no": "category",
+    },
+    "qc_activities": {
+        "report_date": "datetime", "area": "category", "status": "category", "section": "category",
+    },
+    "daily_safety_patrol": {
+        "report_date": "datetime", "area": "category", "status": "category", "section": "category",
+        "type": "category", "group_": "category",
+    },
+    "MAP": {"execution_date": "datetime", "area": "category", "maint_activ_type": "category"},
+}
+
+# Postgres type OIDs that should not come back as strings
+_PG_NUMERIC_OIDS = {20: "Int64", 21: "Int64", 23: "Int64", 700: "float64", 701: "float64", 1700: "float64"}
+_PG_DATE_OIDS = {1082, 1114, 1184}
+
+def apply_table_dtypes(df, table):
+    """Cast `df` to the declared TABLE_DTYPES of `table` (columns not present are skipped)."""
+    for col, kind in TABLE_DTYPES.get(table, {}).items():
+        if col not in df.columns:
+            continue
+        dtype = df[col].dtype
+        if kind == "datetime" and not pd.api.types.is_datetime64_any_dtype(dtype):
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+        elif kind == "hours" and not pd.api.types.is_float_dtype(dtype):
+            df[col] = time_to_hours_series(df[col])
+        elif kind == "float" and not pd.api.types.is_float_dtype(dtype):
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+        elif kind == "timedelta" and not pd.api.types.is_timedelta64_dtype(dtype):
+            df[col] = pd.to_timedelta(df[col], errors="coerce")
+        elif kind == "category" and not isinstance(dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    return df
+
+@shared_result(_table_tag)
+def read_table_copy(table, columns=None, date_range=None, filters=None):
+    """Bulk-read a table with `COPY (SELECT ...) TO STDOUT` and return it typed.
+
+    Same projection/filters as `get_table`, but rows stream as one CSV payload
+    instead of per-row Python tuples, category columns are built while parsing and
+    dates/durations/numbers arrive typed (see TABLE_DTYPES).
+    """
+    where, params = _where_clause(table, date_range, filters)
+    select = sql.SQL("SELECT {} FROM {}").format(_select_list(columns), sql.Identifier(table)) + where
+    declared = TABLE_DTYPES.get(table, {})
+    buf = io.BytesIO()
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(select + sql.SQL(" LIMIT 0"), params)
+            pg_types = {d.name: d.type_code for d in cur.description}
+            # COPY takes no bind parameters, so inline them with the driver's own quoting
+            inner = cur.mogrify(select, params).decode(psycopg2.extensions.encodings[conn.encoding])
+            copy = sql.SQL("COPY ({}) TO STDOUT WITH (FORMAT csv, HEADER true)").format(sql.SQL(inner))
+            cur.copy_expert(copy, buf)
+    buf.seek(0)
+    dtype, parse_dates = {}, []
+    for name, oid in pg_types.items():
+        if declared.get(name) == "category":
+            dtype[name] = "category"
+        elif oid in _PG_NUMERIC_OIDS:
+            dtype[name] = _PG_NUMERIC_OIDS[oid]
+        elif oid in _PG_DATE_OIDS:
+            parse_dates.append(name)
+        else:
+            dtype[name] = object  # keep ids like WO numbers as text
+    df = pd.read_csv(buf, dtype=dtype, parse_dates=parse_dates, keep_default_na=False, na_values=[""])
+    return apply_table_dtypes(df, table)
+
+# ----------------------------------------------------------------------
+# SERVER-SIDE AGGREGATION (GROUP BY in Postgres, only the groups come back)
+# ----------------------------------------------------------------------
+_TIME_BUCKETS = {
+    "day": "{d}",
+    "week": "date_trunc('week', {d})::date",
+    "month": "date_trunc('month', {d})::date",
+}
+
+def _date_expr(column):
+    """Date columns are DATE since migration 005, so the indexed column is used as is."""
+    return sql.Identifier(column)
+
+@shared_result(_table_tag)
+def get_counts(table, column, date_range=None, filters=None, count_column=None, sort="count", limit=None):
+    """`value_counts()` computed in SQL: one row per distinct non-null `column` value.
+
+    `count_column` counts non-null values of that column instead of rows (like
+    `groupby(column)[count_column].count()`); `sort` is "count" (descending) or "value".
+    Read from the kpi_daily rollup when `column` and `filters` are rollup dimensions.
+    """
+    name = column
+    dims = _kpi_dimensions(table, [column, *(filters or {})]) if count_column is None else None
+    if dims is not None:
+        column, filters = dims[column], {**{dims[c]: v for c, v in (filters or {}).items()}, "source_table": table}
+        table, counted = KPI_TABLE, sql.SQL("SUM(row_count)")
+    else:
+        counted = sql.SQL("COUNT({})").format(sql.Identifier(count_column)) if count_column else sql.SQL("COUNT(*)")
+    col = sql.Identifier(column)
+    where, params = _where_clause(table, date_range, filters, extra=[sql.SQL("{} IS NOT NULL").format(col)])
+    order = sql.SQL("n DESC, 1") if sort == "count" else sql.SQL("1")
+    query = sql.SQL("SELECT {col} AS value, {counted} AS n FROM {t}{where} GROUP BY 1 ORDER BY {order}").format(
+        col=col, counted=counted, t=sql.Identifier(table), where=where, order=order
+    )
+    if limit:
+        query += sql.SQL(" LIMIT {}").format(sql.Literal(int(limit)))
+    with get_connection() as conn:
+        df = pd.read_sql(query.as_string(conn), conn, params=params)
+    return pd.Series(df["n"].to_numpy(), index=pd.Index(df["value"], name=name), name="count")
+
+@shared_result(_table_tag)
+def get_time_series(table, freq="day", date_range=None, filters=None, status_column=None):
+    """Per-day/week/month row counts on the table's date column, computed with GROUP BY.
+
+    Returns a frame indexed by period start with a `count` column. With `status_column`
+    it also has `completed`, `on_progress` and `failed` counts, using the same status
+    rules as the Maintenance Dashboard trend charts. Read from the kpi_daily rollup
+    when every filter is a rollup dimension.
+    """
+    dims = _kpi_dimensions(table, [*(filters or {}), *([status_column] if status_column else [])])
+    if dims is not None:
+        filters = {**{dims[c]: v for c, v in (filters or {}).items()}, "source_table": table}
+        table = KPI_TABLE
+        measures = [sql.SQL("SUM(row_count) AS count")]
+        if status_column:
+            measures += [sql.SQL("SUM({m}) AS {m}").format(m=sql.Identifier(m)) for m in ["completed", "on_progress", "failed"]]
+    else:
+        measures = [sql.SQL("COUNT(*) AS count")] + (_status_measures(status_column) if status_column else [])
+    where, params = _where_clause(table, date_range, filters)
+    bucket = sql.SQL(_TIME_BUCKETS[freq]).format(d=_date_expr(TABLE_DATE_COLUMNS[table]))
+    query = sql.SQL("SELECT {bucket} AS period, {measures} FROM {t}{where} GROUP BY 1 ORDER BY 1").format(
+        bucket=bucket, measures=sql.SQL(", ").join(measures), t=sql.Identifier(table), where=where
+    )
+    with get_connection() as conn:
+        df = pd.read_sql(query.as_string(conn), conn, params=params)
+    df = df[df["period"].notna()]
+    df["period"] = pd.to_datetime(df["period"])
+    return df.set_index("period")
+
+def _status_measures(status_column):
+    """completed / on_progress / failed counts under the Maintenance Dashboard status rules."""
+    status = sql.SQL("upper(trim({}))").format(sql.Identifier(status_column))
+    return [
+        sql.SQL("COUNT(*) FILTER (WHERE {s} = 'COMPLETED') AS completed").format(s=status),
+        sql.SQL("COUNT(*) FILTER (WHERE strpos({s}, 'ON-PROGRESS') > 0) AS on_progress").format(s=status),
+        sql.SQL("COUNT(*) FILTER (WHERE {s} IN ('CANCELLED', 'FAILURE', 'FAILED')) AS failed").format(s=status),
+    ]
+
+# ----------------------------------------------------------------------
+# DAILY KPI ROLLUPS (kpi_daily, migration 007; refreshed per day on every write)
+# ----------------------------------------------------------------------
+KPI_TABLE = "kpi_daily"
+KPI_DIMENSIONS = ["area", "section", "status", "type"]
+KPI_COLUMNS = [
+    "source_table", "day", *KPI_DIMENSIONS,
+    "row_count", "completed", "on_progress", "failed", "efficiency_sum", "efficiency_count",
+]
+# Source column behind each rollup key, per table (None: the table has no such column)
+KPI_SOURCES = {
+    "maintenance_reports": {"day": "report_date", "area": "area", "section": "section", "status": "status", "type": None, "efficiency": None},
+    "qc_activities": {"day": "report_date", "area": "area", "section": "section", "status": "status", "type": None, "efficiency": None},
+    "daily_safety_patrol": {"day": "report_date", "area": "area", "section": "section", "status": "status", "type": "type", "efficiency": None},
+    "MAP": {"day": "execution_date", "area": "area", "section": None, "status": None, "type": "maint_activ_type", "efficiency": None},
+    "WPR": {"day": "date", "area": None, "section": None, "status": None, "type": None, "efficiency": "efficiency_ratio"},
+}
+TABLE_DATE_COLUMNS[KPI_TABLE] = "day"
+
+def _kpi_dimensions(table, columns):
+    """Source column -> rollup key for `columns`, or None when the rollup can't answer."""
+    source = KPI_SOURCES.get(table)
+    if source is None:
+        return None
+    dims = {source[d]: d for d in KPI_DIMENSIONS if source[d]}
+    return dims if all(c in dims for c in columns) else None
+
+def _kpi_select(table, where):
+    """One kpi_daily row per (day, area, section, status, type) of `table`, in KPI_COLUMNS order."""
+    source = KPI_SOURCES[table]
+    keys = [sql.SQL("{}::date").format(sql.Identifier(source["day"]))] + [
+        sql.SQL("{}::text").format(sql.Identifier(source[d])) if source[d] else sql.SQL("NULL::text")
+        for d in KPI_DIMENSIONS
+    ]
+    measures = [sql.SQL("COUNT(*)")]
+    measures += _status_measures(source["status"]) if source["status"] else [sql.SQL("0")] * 3
+    if source["efficiency"]:
+        eff = sql.Identifier(source["efficiency"])
+        measures += [sql.SQL("SUM({}::float8)").format(eff), sql.SQL("COUNT({})").format(eff)]
+    else:
+        measures += [sql.SQL("NULL::float8"), sql.SQL("0")]
+    return sql.SQL("SELECT {t}, {keys}, {measures} FROM {src}{where} GROUP BY 2, 3, 4, 5, 6").format(
+        t=sql.Literal(table), keys=sql.SQL(", ").join(keys), measures=sql.SQL(", ").join(measures),
+        src=sql.Identifier(table), where=where,
+    )
+
+def refresh_kpi_daily(conn, table=None, days=None):
+    """Recompute the kpi_daily rows of `table` for `days` from the source rows.
+
+    `days` holds dates or date strings (None/NaN for undated rows). With
+    `days=None` the whole table is rebuilt, and with `table=None` every source
+    table is. Runs in the caller's transaction, like `refresh_wo_permit_overview`.
+    """
+    target = sql.SQL("INSERT INTO {} ({}) ").format(
+        sql.Identifier(KPI_TABLE), sql.SQL(", ").join(sql.Identifier(c) for c in KPI_COLUMNS)
+    )
+    if days is not None:
+        parsed = pd.to_datetime(pd.Series(list(days), dtype=object), errors="coerce")
+        dated, undated = sorted(set(parsed.dropna().dt.strftime("%Y-%m-%d"))), bool(parsed.isna().any())
+    with conn.cursor() as cur:
+        for t in ([table] if table else list(KPI_SOURCES)):
+            # One refresh per source table at a time, or concurrent writers could both insert a day
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [f"{KPI_TABLE}:{t}"])
+            if days is None:
+                cur.execute(sql.SQL("DELETE FROM {} WHERE source_table = %s").format(sql.Identifier(KPI_TABLE)), [t])
+                cur.execute(target + _kpi_select(t, sql.SQL("")))
+                continue
+            cur.execute(
+                sql.SQL("DELETE FROM {} WHERE source_table = %s AND (day = ANY(%s::date[]) OR (%s AND day IS NULL))").format(
+                    sql.Identifier(KPI_TABLE)
+                ),
+                [t, dated, undated],
+            )
+            where = sql.SQL(" WHERE {d} = ANY(%s::date[]) OR (%s AND {d} IS NULL)").format(d=sql.Identifier(KPI_SOURCES[t]["day"]))
+            cur.execute(target + _kpi_select(t, where), [dated, undated])
+
+# ----------------------------------------------------------------------
+# TABLE VERSIONS (writes invalidate only the loaders that read those tables)
+# ----------------------------------------------------------------------
+_TABLE_VERSIONS = {}
+_VERSION_LOCK = threading.Lock()
+
+def table_version(*tables):
+    """Current version of `tables`; pass it to a cached loader so it reloads only when they change."""
+    return tuple(_TABLE_VERSIONS.get(t, 0) for t in tables)
+
+def bump_table_versions(*tables):
+    """Record a committed write to `tables`; every other cached dataset stays warm."""
+    with _VERSION_LOCK:
+        for t in tables:
+            _TABLE_VERSIONS[t] = _TABLE_VERSIONS.get(t, 0) + 1
+    result_cache_invalidate(*tables)
+
+# ----------------------------------------------------------------------
+# DELTA-REFRESHED FRAMES (keep the parsed frame, fetch only rows past the high-water mark)
+# ----------------------------------------------------------------------
+_DELTA_STORE = {}
+_DELTA_LOCKS = {}
+_DELTA_LOCK = threading.Lock()
+_COPY_STATS = {"copies": 0, "seconds": 0.0, "bytes": 0}
+
+def _scalar(value):
+    """numpy scalars -> Python scalars so psycopg2 can adapt them as parameters."""
+    return value.item() if hasattr(value, "item") else value
+
+def _probe_query(table, key, columns, with_columns=False):
+    """COUNT(*), MAX(key), rows at/below the mark and max date, optionally led by the column list."""
+    date_col = TABLE_DATE_COLUMNS.get(table)
+    max_date = sql.SQL("MAX({})::text").format(sql.Identifier(date_col)) if date_col in columns else sql.SQL("NULL")
+    listed = sql.SQL("")
+    if with_columns:
+        listed = sql.SQL(
+            "(SELECT array_agg(attname::text ORDER BY attnum) FROM pg_attribute"
+            " WHERE attrelid = {}::regclass AND attnum > 0 AND NOT attisdropped), "
+        ).format(sql.Literal('"' + table.replace('"', '""') + '"'))
+    return sql.SQL("SELECT {l}COUNT(*), MAX({k}), COUNT(*) FILTER (WHERE {k} <= %s), {d} FROM {t}").format(
+        l=listed, k=sql.Identifier(key), d=max_date, t=sql.Identifier(table)
+    )
+
+def _probe_table(conn, table, key, high_water, columns=None):
+    """Columns, row count, max key, rows at/below the cached mark and max date.
+
+    With the `columns` of the previous probe this is one round trip: the current
+    column list comes from pg_attribute in the same statement. On a first load, or
+    when a column the query names was dropped, the columns are read first (two).
+    """
+    if columns and key in columns:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(_probe_query(table, key, columns, with_columns=True), [high_water])
+                current, *probe = cur.fetchone()
+            return list(current), tuple(probe)
+        except psycopg2.ProgrammingError:
+            conn.rollback()
+    with conn.cursor() as cur:
+        cur.execute(sql.SQL("SELECT * FROM {} LIMIT 0").format(sql.Identifier(table)))
+        columns = [d[0] for d in cur.description]
+        if key not in columns:
+            return columns, None
+        cur.execute(_probe_query(table, key, columns), [high_water])
+        return columns, cur.fetchone()
+
+def load_delta_frame(table, parse, key="id", refresh_every=60, depends_on=None, exclude=(), compact=False, copy=False):
+    """Return `table` after `parse`, refreshed incrementally and shared by every session.
+
+    The frame is the one kept for the whole process: treat it as read-only (filter and
+    slice it, never assign columns). `parse` is where derived columns belong, since
+    it runs once per row. `copy=True` hands out a private copy instead; its cost is
+    counted in `frame_copy_stats()`.
+
+    At most every `refresh_every` seconds, or right after `bump_table_versions(table)`,
+    a cheap probe runs; only rows with `key` above the cached high-water mark are
+    fetched and parsed, then appended. The table is reloaded in full when its
+    columns change, when rows at or below the mark were deleted, or when it has no
+    `key` column. `parse` must work row by row, since it only ever sees the new rows.
+    For a view, `depends_on` names the tables whose version bumps should refresh it.
+    Columns in `exclude` are never read (see HEAVY_TEXT_COLUMNS); `compact=True`
+    passes the kept frame through `compact_frame`.
+
+    The probe doubles as a fingerprint (row count, max key, max date): when it
+    matches, the kept frame is served without reading any rows. When the count and
+    key match but the max date moved, rows were edited in place and the table is
+    reloaded. `refresh_every=0` probes on every call instead of trusting a TTL.
+    """
+    with _DELTA_LOCK:
+        lock = _DELTA_LOCKS.setdefault(table, threading.Lock())
+    with lock:
+        entry = _DELTA_STORE.get(table)
+        version = table_version(*(depends_on or [table]))
+        if entry and entry["version"] == version and time.monotonic() - entry["checked"] < refresh_every:
+            return _hand_out(entry["frame"], copy)
+        with get_connection() as conn:
+            columns, probe = _probe_table(
+                conn, table, key, entry["high_water"] if entry else None, entry["columns"] if entry else None
+            )
+        full_reload = (
+            probe is None or entry is None or entry["high_water"] is None
+            or entry["columns"] != columns or probe[2] != entry["rows"]
+            or (probe[0] == entry["rows"] and (probe[0], _scalar(probe[1]), probe[3]) != entry["fingerprint"])
+        )
+        selected = [c for c in columns if c not in exclude]
+        if full_reload:
+            if entry is not None:
+                # The table changed under the kept frame; cached copies of it are stale too
+                result_cache_invalidate(table)
+            # The probe just proved what the table holds; a cached copy could be up to `ttl` old
+            raw = read_table_copy.uncached(table, columns=selected if exclude else None)
+            rows = len(raw)
+            high_water = _scalar(raw[key].max()) if probe is not None and rows else None
+            frame = parse(raw)
+        elif probe[0] != entry["rows"]:
+            query = sql.SQL("SELECT {c} FROM {t} WHERE {k} > %s ORDER BY {k}").format(
+                c=_select_list(selected if exclude else None), t=sql.Identifier(table), k=sql.Identifier(key)
+            )
+            with get_connection() as conn:
+                new_rows = pd.read_sql(query.as_string(conn), conn, params=[entry["high_water"]])
+            rows = entry["rows"] + len(new_rows)
+            high_water = _scalar(new_rows[key].max()) if len(new_rows) else entry["high_water"]
+            # Categories differ between the two parts, so re-apply the declared dtypes after appending
+            new_rows = parse(apply_table_dtypes(new_rows, table))
+            frame = apply_table_dtypes(pd.concat([entry["frame"], new_rows], ignore_index=True), table)
+        else:
+            frame, rows, high_water = entry["frame"], entry["rows"], entry["high_water"]
+        if compact and frame is not (entry or {}).get("frame"):
+            frame = compact_frame(frame)
+        _DELTA_STORE[table] = {
+            "frame": frame,
+            "columns": columns,
+            "rows": rows,
+            "high_water": high_water,
+            # Count and key describe the kept rows, so rows written since the probe are caught by the next one
+            "fingerprint": (rows, high_water, probe[3] if probe is not None else None),
+            "checked": time.monotonic(),
+            "version": version,
+        }
+        return _hand_out(frame, copy)
+
+def _hand_out(frame, copy):
+    if not copy:
+        return frame
+    started = time.perf_counter()
+    private = frame.copy()
+    elapsed = time.perf_counter() - started
+    with _DELTA_LOCK:
+        _COPY_STATS["copies"] += 1
+        _COPY_STATS["seconds"] += elapsed
+        _COPY_STATS["bytes"] += int(frame.memory_usage(deep=False).sum())
+    return private
+
+def frame_copy_stats():
+    """Copies handed out by load_delta_frame(copy=True) in this process, with their total time and size."""
+    with _DELTA_LOCK:
+        return dict(_COPY_STATS)
+
+# ----------------------------------------------------------------------
+# COMPACT FRAMES (long free text stays in Postgres until a table view needs it)
+# ----------------------------------------------------------------------
+# Free-text columns left out of the long-lived frames; paged table views read them with their page
+HEAVY_TEXT_COLUMNS = {
+    "maintenance_reports": ["observation", "recommendation", "reason_remark"],
+    "WPR": ["wo_description", "remarks"],
+}
+
+def compact_frame(frame, max_category_ratio=0.5):
+    """Downcast integer columns and store repetitive text as categories, in place.
+
+    A text column becomes categorical when its distinct values are at most
+    `max_category_ratio` of its non-null values.
+    """
+    for col in frame.columns:
+        values = frame[col]
+        if pd.api.types.is_integer_dtype(values.dtype):
+            frame[col] = pd.to_numeric(values, downcast="integer")
+        elif pd.api.types.is_object_dtype(values.dtype) or pd.api.types.is_string_dtype(values.dtype):
+            filled = values.count()
+            if filled and values.nunique() <= filled * max_category_ratio:
+                frame[col] = values.astype("category")
+    return frame
+
+def delta_store_memory():
+    """Rows, columns and deep size of every frame kept by load_delta_frame, for sizing workers."""
+    with _DELTA_LOCK:
+        entries = list(_DELTA_STORE.items())
+    report = pd.DataFrame(
+        [
+            {"dataset": table, "rows": len(e["frame"]), "columns": e["frame"].shape[1],
+             "mb": e["frame"].memory_usage(deep=True).sum() / 2**20}
+            for table, e in entries
+        ],
+        columns=["dataset", "rows", "columns", "mb"],
+    )
+    return report.round({"mb": 2})
+
+# ----------------------------------------------------------------------
+# WO & PERMIT OVERVIEW (maintained summary table, refreshed per WO on write)
+# ----------------------------------------------------------------------
+OVERVIEW_TABLE = "wo_permit_overview"
+TABLE_DATE_COLUMNS[OVERVIEW_TABLE] = "maintenance_report_date"
+
+OVERVIEW_COLUMNS = [
+    "maintenance_wo", "maintenance_area", "maintenance_status", "maintenance_report_date",
+    "permit_number", "permit_date", "work_actual_start_time", "work_finish_time",
+    "work_duration", "total_permit_time", "efficiency", "qc_id", "qc_area", "scope_of_work",
+]
+
+# 🚨 FIX: Using the Full-Width Hash "＃" as identified by the Postgres HINT
+OVERVIEW_SELECT = """
+    SELECT 
+        mr.wo_number AS maintenance_wo,
+        mr.area AS maintenance_area,
+        mr.status AS maintenance_status,
+        mr.report_date AS maintenance_report_date,
+        wpr.permit_number,
+        wpr.date AS permit_date,
+        wpr.work_actual_start_time,
+        wpr.work_finish_time,
+        wpr.work_minutes / 60 AS work_duration,          -- hours, from the typed columns of 004
+        wpr.permit_cycle_minutes / 60 AS total_permit_time,
+        wpr.efficiency_ratio AS efficiency,
+        qc.id AS qc_id,
+        qc.area AS qc_area,
+        qc.scope_of_work
+    FROM "maintenance_reports" mr
+    LEFT JOIN "WPR" wpr ON mr.wo_number = wpr.wo_number
+    LEFT JOIN "qc_activities" qc ON mr.wo_number = qc.wo_number
+    LEFT JOIN "MAP" m ON mr.wo_number = m."wo_＃"   -- 🚨 SWAPPED TO FULL-WIDTH ＃
+"""
+
+def refresh_wo_permit_overview(conn, wo_numbers=None):
+    """Recompute overview rows for `wo_numbers` (everything when None) in the caller's transaction."""
+    insert = f"INSERT INTO {OVERVIEW_TABLE} ({', '.join(OVERVIEW_COLUMNS)}) {OVERVIEW_SELECT}"
+    with conn.cursor() as cur:
+        if wo_numbers is None:
+            cur.execute(f"TRUNCATE {OVERVIEW_TABLE}")
+            cur.execute(insert)
+            return
+        wos = sorted({w for w in wo_numbers if w})
+        if wos:
+            # One refresh per WO at a time (sorted, so writers can't deadlock), or two
+            # transactions could each insert the other's freshly committed rows
+            for wo in wos:
+                cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [f"{OVERVIEW_TABLE}:{wo}"])
+            cur.execute(f"DELETE FROM {OVERVIEW_TABLE} WHERE maintenance_wo = ANY(%s)", [wos])
+            cur.execute(insert + "    WHERE mr.wo_number = ANY(%s)", [wos])
+
+@shared_result([OVERVIEW_TABLE])
+def get_wo_permit_overview(date_range=None, areas=None, filters=None):
+    """Unified view for the Overview Dashboard, read from the precomputed summary table.
+
+    The report-date range, maintenance areas and any extra `filters` are applied in SQL.
+    Rows are per WO x permit x QC activity; see `get_wo_permit_rollup` for one row per WO.
+    """
+    where, params = _where_clause(OVERVIEW_TABLE, date_range, {"maintenance_area": areas, **(filters or {})})
+    query = sql.SQL("SELECT {} FROM {}").format(_select_list(OVERVIEW_COLUMNS), sql.Identifier(OVERVIEW_TABLE)) + where
+    with get_connection() as conn:
+        df = pd.read_sql_query(query.as_string(conn), conn, params=params)
         
-        # Ensure efficiency is numeric before rounding
-        df['efficiency'] = pd.to_numeric(df['efficiency'], errors='coerce')
-        df['efficiency'] = df['efficiency'].round(2)
+    # Ensure efficiency is numeric before rounding
+    df['efficiency'] = pd.to_numeric(df['efficiency'], errors='coerce')
+    df['efficiency'] = df['efficiency'].round(2)
+    
+    # Apply visual formatting (durations are float hours)
+    for col in ['work_actual_start_time', 'work_finish_time']:
+        if col in df.columns:
+            df[col] = format_timedelta_to_h_m_series(df[col])
+    for col in ['work_duration', 'total_permit_time']:
+        df[col] = format_timedelta_to_h_m_series(pd.to_timedelta(pd.to_numeric(df[col], errors='coerce'), unit='h'))
         
-        # Apply visual formatting
-        time_cols = ['work_actual_start_time', 'work_finish_time', 'work_duration', 'total_permit_time']
-        for col in time_cols:
-            if col in df.columns:
-                df[col] = df[col].apply(format_timedelta_to_h_m)
-            
-        return df
-    finally:
-        conn.close()
+    return df
+
+# One row per WO: each child table is aggregated per wo_number before joining,
+# so permits x QC x MAP rows no longer multiply. {mr_where} filters the
+# maintenance reports that define which WOs appear.
+OVERVIEW_ROLLUP_SELECT = r"""
+    WITH mr AS (
+        SELECT wo_number,
+               (array_agg(area ORDER BY report_date DESC NULLS LAST, id DESC))[1] AS maintenance_area,
+               (array_agg(status ORDER BY report_date DESC NULLS LAST, id DESC))[1] AS maintenance_status,
+               MIN(report_date) AS first_report_date,
+               MAX(report_date) AS maintenance_report_date,
+               COUNT(*) AS report_count
+        FROM "maintenance_reports"{mr_where}
+        GROUP BY wo_number
+    ),
+    wpr AS (
+        SELECT wo_number,
+               COUNT(permit_number) AS permit_count,
+               MIN(date) AS first_permit_date,
+               MAX(date) AS last_permit_date,
+               AVG(efficiency_ratio)::numeric AS avg_efficiency
+        FROM "WPR"
+        GROUP BY wo_number
+    ),
+    qc AS (
+        SELECT wo_number,
+               COUNT(*) AS qc_count,
+               MAX(report_date) AS last_qc_date,
+               (array_agg(status ORDER BY report_date DESC NULLS LAST, id DESC))[1] AS latest_qc_status
+        FROM "qc_activities"
+        GROUP BY wo_number
+    ),
+    map AS (
+        SELECT "wo_＃" AS wo_number, COUNT(*) AS map_count, MAX(execution_date) AS last_map_date
+        FROM "MAP"
+        GROUP BY "wo_＃"
+    )
+    SELECT mr.wo_number AS maintenance_wo, mr.maintenance_area, mr.maintenance_status,
+           mr.first_report_date, mr.maintenance_report_date, mr.report_count,
+           COALESCE(wpr.permit_count, 0) AS permit_count, wpr.first_permit_date, wpr.last_permit_date,
+           ROUND(wpr.avg_efficiency, 2) AS avg_efficiency,
+           COALESCE(qc.qc_count, 0) AS qc_count, qc.last_qc_date, qc.latest_qc_status,
+           COALESCE(map.map_count, 0) AS map_count, map.last_map_date
+    FROM mr
+    LEFT JOIN wpr ON wpr.wo_number = mr.wo_number
+    LEFT JOIN qc ON qc.wo_number = mr.wo_number
+    LEFT JOIN map ON map.wo_number = mr.wo_number
+    ORDER BY mr.maintenance_report_date DESC NULLS LAST, mr.wo_number
+"""
+
+@shared_result(["maintenance_reports", "WPR", "qc_activities", "MAP"])
+def get_wo_permit_rollup(date_range=None, areas=None):
+    """Rollup mode of the overview: exactly one row per WO with permit/QC/MAP counts,
+    first/last dates, mean efficiency and latest statuses.
+
+    A WO is included when it has a maintenance report in `date_range` for one of `areas`.
+    """
+    where, params = _where_clause(
+        "maintenance_reports", date_range, {"area": areas},
+        extra=[sql.SQL("wo_number IS NOT NULL")],
+    )
+    query = sql.SQL(OVERVIEW_ROLLUP_SELECT).format(mr_where=where)
+    with get_connection() as conn:
+        return pd.read_sql_query(query.as_string(conn), conn, params=params)
+
+def get_wo_permit_detail(wo_number):
+    """Drill-down for one WO: its joined permit/QC rows from the overview summary table."""
+    return get_wo_permit_overview(filters={"maintenance_wo": wo_number})
+
+def get_date_bounds(table):
+    """(min, max) of the table's date column, or (None, None) when it has no valid dates."""
+    query = sql.SQL("SELECT MIN({d}), MAX({d}) FROM {t}").format(
+        d=_date_expr(TABLE_DATE_COLUMNS[table]), t=sql.Identifier(table)
+    )
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(query)
+            return cur.fetchone()
+
+def get_distinct_values(table, column):
+    """Sorted non-null distinct values of `column`, for filter widgets."""
+    query = sql.SQL("SELECT DISTINCT {c} FROM {t} WHERE {c} IS NOT NULL ORDER BY 1").format(
+        c=sql.Identifier(column), t=sql.Identifier(table)
+    )
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(query)
+            return [r[0] for r in cur.fetchall()]
+
+# ----------------------------------------------------------------------
+# FULL-TEXT SEARCH (expression GIN indexes from migration 008)
+# ----------------------------------------------------------------------
+SEARCH_CONFIG = "english"
+# Searched text per table, most important first (weights A, B, C), and the reference shown with a hit
+SEARCH_SOURCES = {
+    "maintenance_reports": {"columns": ["observation", "recommendation", "root_cause"], "ref": "wo_number"},
+    "qc_activities": {"columns": ["observation_findings"], "ref": "wo_number"},
+    "daily_safety_patrol": {"columns": ["observation"], "ref": "permit_no"},
+}
+
+def search_document(table):
+    """The weighted tsvector indexed for `table`; queries repeat it verbatim so the GIN index applies."""
+    return " || ".join(
+        f"""setweight(to_tsvector('{SEARCH_CONFIG}', coalesce("{col}", '')), '{weight}')"""
+        for col, weight in zip(SEARCH_SOURCES[table]["columns"], "ABCD")
+    )
+
+def _search_tsquery():
+    return sql.SQL("websearch_to_tsquery({}, %(q)s)").format(sql.Literal(SEARCH_CONFIG))
+
+def _search_tags(sources=None, **_):
+    return list(sources or SEARCH_SOURCES)
+
+@shared_result(_search_tags)
+def count_search_matches(query, sources=None):
+    """Matches per source table for a web-style `query` ("pump seal leak", "valve -gasket")."""
+    parts = [
+        sql.SQL("SELECT {name} AS source, COUNT(*) AS matches FROM {t} WHERE ({doc}) @@ {q}").format(
+            name=sql.Literal(t), t=sql.Identifier(t), doc=sql.SQL(search_document(t)), q=_search_tsquery()
+        )
+        for t in (sources or SEARCH_SOURCES)
+    ]
+    with get_connection() as conn:
+        df = pd.read_sql(sql.SQL(" UNION ALL ").join(parts).as_string(conn), conn, params={"q": query})
+    return df.set_index("source")["matches"]
+
+@shared_result(_search_tags)
+def search_records(query, sources=None, page=1, page_size=20):
+    """One page of full-text hits across `sources`, best `ts_rank` first.
+
+    Only the matching rows are touched (GIN index) and only the page gets a
+    highlighted `snippet`; columns are source, id, day, area, ref, rank, snippet.
+    """
+    hits = [
+        sql.SQL("""
+            SELECT {name} AS source, id, {day} AS day, area::text AS area, {ref}::text AS ref,
+                   ts_rank({doc}, {q}) AS rank, concat_ws(' ', {cols}) AS body
+            FROM {t} WHERE ({doc}) @@ {q}
+        """).format(
+            name=sql.Literal(t), t=sql.Identifier(t), day=sql.Identifier(TABLE_DATE_COLUMNS[t]),
+            ref=sql.Identifier(SEARCH_SOURCES[t]["ref"]), doc=sql.SQL(search_document(t)), q=_search_tsquery(),
+            cols=sql.SQL(", ").join(sql.Identifier(c) for c in SEARCH_SOURCES[t]["columns"]),
+        )
+        for t in (sources or SEARCH_SOURCES)
+    ]
+    query_sql = sql.SQL("""
+        SELECT source, id, day, area, ref, rank,
+               ts_headline({cfg}, body, {q}, 'MaxFragments=2, MaxWords=25, MinWords=8, StartSel=**, StopSel=**') AS snippet
+        FROM ({hits} ORDER BY rank DESC, day DESC NULLS LAST, source, id LIMIT %(limit)s OFFSET %(offset)s) page
+        ORDER BY rank DESC, day DESC NULLS LAST, source, id
+    """).format(cfg=sql.Literal(SEARCH_CONFIG), q=_search_tsquery(), hits=sql.SQL(" UNION ALL ").join(hits))
+    params = {"q": query, "limit": int(page_size), "offset": (max(int(page), 1) - 1) * int(page_size)}
+    with get_connection() as conn:
+        return pd.read_sql(query_sql.as_string(conn), conn, params=params)
+
+# Numeric duration columns on WPR (migration 004), computed once at ingest
+WPR_DURATION_COLUMNS = ["work_minutes", "permit_cycle_minutes", "efficiency_ratio"]
+
+# WPR plus per-phase intervals and the dashboard KPIs, computed by Postgres (migration 006)
+WPR_DURATIONS_VIEW = "vw_wpr_durations"
+WPR_PHASES = ["request_to_prep", "prep_to_issuance", "issuance_to_start", "start_to_finish", "finish_to_close"]
+TABLE_DATE_COLUMNS[WPR_DURATIONS_VIEW] = "date"
+CACHE_SOURCES[WPR_DURATIONS_VIEW] = ["WPR"]
+HEAVY_TEXT_COLUMNS[WPR_DURATIONS_VIEW] = HEAVY_TEXT_COLUMNS["WPR"]
+TABLE_DTYPES[WPR_DURATIONS_VIEW] = {
+    "date": "datetime", "position": "category", "plant/rtm_no": "category",
+    **{p: "timedelta" for p in [*WPR_PHASES, "request_to_close"]},
+}
+
+def _hms_labels(minutes):
+    """Float minutes -> "HH:MM:SS" text in the legacy (m-l)/(n-i) format."""
+    seconds = (minutes * 60).round()
+    valid = seconds.notna()
+    secs = seconds[valid].astype("int64")
+    labels = (
+        (secs // 3600).astype(str).str.zfill(2) + ":"
+        + (secs % 3600 // 60).astype(str).str.zfill(2) + ":"
+        + (secs % 60).astype(str).str.zfill(2)
+    )
+    return labels.reindex(minutes.index)
+
+def add_wpr_durations(frame):
+    """Compute work duration (M-L), end-to-end permit cycle (N-I) in minutes and their
+    ratio for every row of a WPR frame, in place.
+
+    Clock times are parsed with `normalize_times`; a finish earlier than the start
+    counts as past midnight. Rows without usable clock times keep whatever the
+    legacy "(m-l)" / "(n-i)" / "(m-l)/(n-i)" text says, and blank legacy text is
+    filled from the computed values so older readers keep working.
+    """
+    for col in ["work_actual_start_time", "work_finish_time", "time_of_requesting_permit",
+                "swp_closing_time", "(m-l)", "(n-i)", "(m-l)/(n-i)"]:
+        if col not in frame.columns:
+            frame[col] = None
+    clock = {c: normalize_times(frame[c])["minutes"] for c in
+             ["work_actual_start_time", "work_finish_time", "time_of_requesting_permit", "swp_closing_time"]}
+    work = (clock["work_finish_time"] - clock["work_actual_start_time"]) % 1440
+    cycle = (clock["swp_closing_time"] - clock["time_of_requesting_permit"]) % 1440
+    work = work.fillna(time_to_hours_series(frame["(m-l)"]) * 60)
+    cycle = cycle.fillna(time_to_hours_series(frame["(n-i)"]) * 60)
+    ratio = (work / cycle.where(cycle > 0)).fillna(pd.to_numeric(frame["(m-l)/(n-i)"], errors="coerce"))
+
+    frame["work_minutes"] = work
+    frame["permit_cycle_minutes"] = cycle
+    frame["efficiency_ratio"] = ratio
+    frame["(m-l)"] = frame["(m-l)"].where(frame["(m-l)"].notna(), _hms_labels(work))
+    frame["(n-i)"] = frame["(n-i)"].where(frame["(n-i)"].notna(), _hms_labels(cycle))
+    frame["(m-l)/(n-i)"] = frame["(m-l)/(n-i)"].where(frame["(m-l)/(n-i)"].notna(), ratio.round(2).astype(str).where(ratio.notna()))
+    return frame
+
+def _db_value(v):
+    """NaN/NaT/NA -> None and numpy scalars -> Python, for psycopg2 parameters."""
+    return None if pd.isna(v) else _scalar(v)
+
+# Insertable columns per table (ids are generated by Postgres)
+WPR_COLUMNS = [
+    "receiver_name","position","date","crew_members","wo_number","wo_description",
+    "permit_number","plant/rtm_no","time_of_requesting_permit",
+    "time_of_issuer_starting_swp_preperation","time_of_permit_issuance",
+    "work_actual_start_time","work_finish_time","swp_closing_time",
+    "remarks","(m-l)","(n-i)","(m-l)/(n-i)", *WPR_DURATION_COLUMNS
+]
+DMR_COLUMNS = [
+    "area","unit","tag_number","wo_number","observation","recommendation",
+    "date","status","reason_remark","root_cause","section","report_date"
+]
+QC_COLUMNS = [
+    "sn","area","wo_number","eqp_number","scope_of_work","work_procedure_use",
+    "observation_findings","action","status","reported_by","remarks","section","report_date"
+]
+PATROL_COLUMNS = [
+    "area","rtm","permit_no","work_description","observation","action","type",
+    "group_","status","report_by","section","report_date"
+]
+MAP_COLUMNS = [
+    "sn","execution_date","dmr_sn","wo_＃","maint_activ_type","area",
+    "functional_loc._/_item_no.","description","activity_overvise","note/highlight"
+]
 
 def insert_wpr(conn, payload):
     """Professional Write logic for Work Permits."""
-    cols = [
-        "receiver_name","position","date","crew_members","wo_number","wo_description",
-        "permit_number","plant/rtm_no","time_of_requesting_permit",
-        "time_of_issuer_starting_swp_preperation","time_of_permit_issuance",
-        "work_actual_start_time","work_finish_time","swp_closing_time",
-        "remarks","(m-l)","(n-i)","(m-l)/(n-i)"
-    ]
+    cols = WPR_COLUMNS
+    # Durations are computed here once, so readers never parse time text again
+    row = add_wpr_durations(pd.DataFrame([payload], dtype=object)).iloc[0]
     # PostgreSQL uses %s placeholders
     placeholders = ",".join(["%s"] * len(cols))
-    query = f'INSERT INTO "WPR" ({",".join([f'"{c}"' for c in cols])}) VALUES ({placeholders})'
+    quoted = ",".join(f'"{c}"' for c in cols)
+    query = f'INSERT INTO "WPR" ({quoted}) VALUES ({placeholders})'
     
     with conn.cursor() as cur:
-        cur.execute(query, [payload.get(c) for c in cols])
+        cur.execute(query, [_db_value(row.get(c)) for c in cols])
+    refresh_wo_permit_overview(conn, [payload.get("wo_number")])
+    refresh_kpi_daily(conn, "WPR", [payload.get("date")])
 
 def insert_dmr(conn, payload):
     """Professional Write logic for Maintenance Reports."""
-    cols = [
-        "area","unit","tag_number","wo_number","observation","recommendation",
-        "date","status","reason_remark","root_cause","section","report_date"
-    ]
+    cols = DMR_COLUMNS
     placeholders = ",".join(["%s"] * len(cols))
     query = f'INSERT INTO "maintenance_reports" ({",".join(cols)}) VALUES ({placeholders})'
     
     with conn.cursor() as cur:
         cur.execute(query, [payload.get(c) for c in cols])
+    refresh_wo_permit_overview(conn, [payload.get("wo_number")])
+    refresh_kpi_daily(conn, "maintenance_reports", [payload.get("report_date")])
+
+# ----------------------------------------------------------------------
+# BULK INSERTS (multi-row VALUES, committed in batches)
+# ----------------------------------------------------------------------
+def _as_frame(rows, cols):
+    """DataFrame or iterable of payload dicts -> object frame with exactly `cols`."""
+    frame = rows.copy() if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows))
+    for col in cols:
+        if col not in frame.columns:
+            frame[col] = None
+    frame = frame[cols]
+    # Date columns are TEXT 'YYYY-MM-DD' like the form writes them
+    for col in frame.columns[[pd.api.types.is_datetime64_any_dtype(t) for t in frame.dtypes]]:
+        frame[col] = frame[col].dt.strftime("%Y-%m-%d")
+    return frame.astype(object)
+
+def _insert_many(conn, table, cols, frame, batch_size, progress=None, wo_column=None):
+    """INSERT `frame` in batches of `batch_size` rows, one multi-row VALUES statement
+    and one commit per batch. Returns per-batch stats and passes each to `progress`."""
+    query = sql.SQL("INSERT INTO {} ({}) VALUES %s").format(
+        sql.Identifier(table), sql.SQL(", ").join(sql.Identifier(c) for c in cols)
+    ).as_string(conn)
+    stats = []
+    for number, start in enumerate(range(0, len(frame), batch_size), start=1):
+        batch = frame.iloc[start:start + batch_size]
+        started = time.perf_counter()
+        values = [tuple(_db_value(v) for v in row) for row in batch.itertuples(index=False, name=None)]
+        with conn.cursor() as cur:
+            execute_values(cur, query, values, page_size=len(values))
+        if wo_column:
+            refresh_wo_permit_overview(conn, batch[wo_column].tolist())
+        refresh_kpi_daily(conn, table, batch[KPI_SOURCES[table]["day"]].tolist())
+        conn.commit()
+        bump_table_versions(table, KPI_TABLE, *([OVERVIEW_TABLE] if wo_column else []))
+        elapsed = time.perf_counter() - started
+        stat = {
+            "table": table, "batch": number, "rows": len(batch),
+            "rows_done": start + len(batch), "rows_total": len(frame),
+            "seconds": round(elapsed, 3), "rows_per_second": round(len(batch) / elapsed, 1) if elapsed else None,
+        }
+        stats.append(stat)
+        if progress:
+            progress(stat)
+    return stats
+
+def insert_wpr_many(conn, rows, batch_size=500, progress=None):
+    """Bulk `insert_wpr`: durations are computed for the whole frame before writing."""
+    frame = add_wpr_durations(_as_frame(rows, WPR_COLUMNS))
+    return _insert_many(conn, "WPR", WPR_COLUMNS, frame[WPR_COLUMNS], batch_size, progress, wo_column="wo_number")
+
+def insert_dmr_many(conn, rows, batch_size=500, progress=None):
+    """Bulk `insert_dmr` into maintenance_reports."""
+    return _insert_many(conn, "maintenance_reports", DMR_COLUMNS, _as_frame(rows, DMR_COLUMNS), batch_size, progress, wo_column="wo_number")
+
+def insert_qc_many(conn, rows, batch_size=500, progress=None):
+    """Bulk insert into qc_activities."""
+    return _insert_many(conn, "qc_activities", QC_COLUMNS, _as_frame(rows, QC_COLUMNS), batch_size, progress, wo_column="wo_number")
+
+def insert_patrol_many(conn, rows, batch_size=500, progress=None):
+    """Bulk insert into daily_safety_patrol."""
+    return _insert_many(conn, "daily_safety_patrol", PATROL_COLUMNS, _as_frame(rows, PATROL_COLUMNS), batch_size, progress)
+
+def insert_map_many(conn, rows, batch_size=500, progress=None):
+    """Bulk insert into MAP."""
+    return _insert_many(conn, "MAP", MAP_COLUMNS, _as_frame(rows, MAP_COLUMNS), batch_size, progress, wo_column="wo_＃")
+
+# ----------------------------------------------------------------------
+# SPREADSHEET UPLOADS (validated per column, written by a background job)
+# ----------------------------------------------------------------------
+WPR_TIME_COLUMNS = [
+    "time_of_requesting_permit","time_of_issuer_starting_swp_preperation",
+    "time_of_permit_issuance","work_actual_start_time","work_finish_time","swp_closing_time"
+]
+META_COLUMNS = ["supervisor","department","shift","done_by"]
+# What a supervisor's register may contain (durations are always recomputed)
+WPR_UPLOAD_COLUMNS = [c for c in WPR_COLUMNS if c not in WPR_DURATION_COLUMNS and c not in ("(m-l)","(n-i)","(m-l)/(n-i)")] + META_COLUMNS
+DMR_UPLOAD_COLUMNS = DMR_COLUMNS
+
+def read_upload(file):
+    """xlsx/csv upload -> object frame, headers cleaned to DB names ('WO Number' -> 'wo_number')."""
+    name = getattr(file, "name", str(file)).lower()
+    if name.endswith((".xlsx", ".xls")):
+        frame = pd.read_excel(file, dtype=object)
+    else:
+        frame = pd.read_csv(file, dtype=object)
+    frame.columns = frame.columns.astype(str).str.strip().str.lower().str.replace(r"\s+", "_", regex=True)
+    return frame
+
+# ISO dates only: Excel date cells arrive as timestamps and print this way, while
+# "05/01/2024" is ambiguous (day or month first) and is rejected rather than guessed
+_ISO_DATE = r"^\d{4}-\d{2}-\d{2}(?:[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?$"
+
+def _prepare_upload(frame, cols, date_columns, time_columns=()):
+    """Same rules as the WO 360 form, one pass per column. Returns (rows, rejected)."""
+    text = pd.DataFrame({
+        c: frame[c].astype("string").str.strip().replace("", pd.NA) if c in frame.columns
+        else pd.Series(pd.NA, index=frame.index, dtype="string")
+        for c in cols
+    })
+    problems = {"wo_number is required": text["wo_number"].isna()}
+    for col in date_columns:
+        iso = text[col].where(text[col].str.match(_ISO_DATE, na=False))
+        parsed = pd.to_datetime(iso, errors="coerce", format="ISO8601")
+        problems[f"bad {col} (use YYYY-MM-DD)"] = parsed.isna() & text[col].notna()
+        text[col] = parsed.dt.strftime("%Y-%m-%d")
+    for col in time_columns:
+        parsed = normalize_times(text[col])["hhmmss"]
+        problems[f"bad {col}"] = parsed.isna() & text[col].notna()
+        text[col] = parsed
+
+    error = pd.Series("", index=text.index, dtype=object)
+    for message, mask in problems.items():
+        error = error.where(~mask, error + message + "; ")
+    bad = error.ne("")
+    rows = text.loc[~bad].astype(object)
+    rows = rows.where(rows.notna(), None).reset_index(drop=True)
+    rejected = frame.loc[bad].assign(error=error[bad].str.rstrip("; "))
+    return rows, rejected
+
+def prepare_wpr_upload(frame):
+    """Validate/normalize an uploaded permit register (dates, HH:MM:SS times, WO required)."""
+    rows, rejected = _prepare_upload(frame, WPR_UPLOAD_COLUMNS, ["date"], WPR_TIME_COLUMNS)
+    rows["done_by"] = rows["done_by"].where(rows["done_by"].notna(), rows["receiver_name"])
+    return rows, rejected
+
+def prepare_dmr_upload(frame):
+    """Validate/normalize uploaded DMR rows; a blank report_date falls back to `date`."""
+    rows, rejected = _prepare_upload(frame, DMR_UPLOAD_COLUMNS, ["date", "report_date"])
+    rows["report_date"] = rows["report_date"].where(rows["report_date"].notna(), rows["date"])
+    return rows, rejected
+
+def upsert_work_order_meta(conn, rows):
+    """UPSERT work_order_meta for uploaded WOs that carry any meta value (last row per WO wins)."""
+    meta = rows[["wo_number", *META_COLUMNS]]
+    meta = meta[meta[["supervisor","department","shift"]].notna().any(axis=1)].drop_duplicates("wo_number", keep="last")
+    if meta.empty:
+        return 0
+    with conn.cursor() as cur:
+        execute_values(cur, """
+            INSERT INTO work_order_meta (wo_number, supervisor, department, shift, done_by)
+            VALUES %s
+            ON CONFLICT(wo_number) DO UPDATE SET
+                supervisor=EXCLUDED.supervisor,
+                department=EXCLUDED.department,
+                shift=EXCLUDED.shift,
+                done_by=EXCLUDED.done_by
+        """, [tuple(_db_value(v) for v in row) for row in meta.itertuples(index=False, name=None)])
+    return len(meta)
+
+# Upload jobs live for the process, like the pool: any session can poll them
+_UPLOAD_JOBS = {}
+_UPLOAD_LOCK = threading.Lock()
+# Seconds a finished job stays around for pollers to show its outcome
+UPLOAD_JOB_TTL = 3600
+
+def _prune_upload_jobs():
+    """Forget jobs that finished more than UPLOAD_JOB_TTL ago; call with _UPLOAD_LOCK held."""
+    cutoff = time.time() - UPLOAD_JOB_TTL
+    for job_id in [i for i, job in _UPLOAD_JOBS.items() if job["finished"] and job["finished"] < cutoff]:
+        del _UPLOAD_JOBS[job_id]
+
+def start_upload_job(wpr_rows=None, dmr_rows=None, batch_size=500):
+    """Write prepared WPR/DMR rows on a daemon thread; returns a job id for `upload_job_status`."""
+    wpr_rows = wpr_rows if wpr_rows is not None else pd.DataFrame(columns=WPR_UPLOAD_COLUMNS)
+    dmr_rows = dmr_rows if dmr_rows is not None else pd.DataFrame(columns=DMR_UPLOAD_COLUMNS)
+    job_id = f"{time.time_ns():x}"
+    with _UPLOAD_LOCK:
+        _prune_upload_jobs()
+        _UPLOAD_JOBS[job_id] = {
+            "id": job_id, "status": "running", "error": None,
+            "rows_done": 0, "rows_total": len(wpr_rows) + len(dmr_rows),
+            "batches": [], "started": time.time(), "finished": None,
+        }
+    threading.Thread(
+        target=_run_upload_job, args=(job_id, wpr_rows, dmr_rows, batch_size),
+        name=f"upload-{job_id}", daemon=True,
+    ).start()
+    return job_id
+
+def _run_upload_job(job_id, wpr_rows, dmr_rows, batch_size):
+    job = _UPLOAD_JOBS[job_id]
+
+    def progress(stat):
+        with _UPLOAD_LOCK:
+            job["batches"].append(stat)
+            job["rows_done"] += stat["rows"]
+
+    try:
+        with get_connection() as conn:
+            if len(wpr_rows):
+                upsert_work_order_meta(conn, wpr_rows)
+                conn.commit()
+                bump_table_versions("work_order_meta")
+                insert_wpr_many(conn, wpr_rows, batch_size, progress)
+            if len(dmr_rows):
+                insert_dmr_many(conn, dmr_rows, batch_size, progress)
+        status, error = "done", None
+    except Exception as e:
+        # Batches committed before the failure stay written
+        status, error = "failed", str(e)
+    with _UPLOAD_LOCK:
+        job.update(status=status, error=error, finished=time.time())
+
+def upload_job_status(job_id):
+    """Snapshot of an upload job (None if unknown to this process or expired)."""
+    with _UPLOAD_LOCK:
+        _prune_upload_jobs()
+        job = _UPLOAD_JOBS.get(job_id)
+        return dict(job, batches=list(job["batches"])) if job else None
+
+def normalize_times(series):
+    """Vectorized clock-time parsing shared by the WPR loader and the WO 360 form.
+
+    Handles `13;20`, `07:00:00.000000`, `HH:MM`, `HH:MM:SS` and blanks/NaN/NaT on
+    the whole Series at once. Returns a frame aligned to `series` with `hhmm`
+    ("HH:MM"), `hhmmss` ("HH:MM:SS") and `minutes` since midnight; values that do
+    not parse are missing in all three.
+    """
+    text = (
+        pd.Series(series).astype("string")
+        .str.strip()
+        .str.replace(";", ":", regex=False)   # '13;20' -> '13:20'
+        .str.split(".", n=1).str[0]          # '07:00:00.000000' -> '07:00:00'
+    )
+    dt = pd.to_datetime(text, format="%H:%M:%S", errors="coerce")
+    short = dt.isna() & text.notna()
+    if short.any():
+        dt[short] = pd.to_datetime(text[short], format="%H:%M", errors="coerce")
+    return pd.DataFrame({
+        "hhmm": dt.dt.strftime("%H:%M"),
+        "hhmmss": dt.dt.strftime("%H:%M:%S"),
+        "minutes": dt.dt.hour * 60 + dt.dt.minute + dt.dt.second / 60,
+    }, index=text.index)
 
 def time_to_hours(t):
     """Utility to convert time strings/timedeltas to numeric hours."""
@@ -119,3 +1572,73 @@ def format_timedelta_to_h_m(td):
     hours = int(abs_seconds // 3600)
     minutes = int((abs_seconds % 3600) // 60)
     return f"{sign}{hours:02d}:{minutes:02d}"
+
+# ----------------------------------------------------------------------
+# SERIES VERSIONS of the two helpers above (same output, one pass per column)
+# ----------------------------------------------------------------------
+_NS_PER_HOUR = 3_600_000_000_000
+_NS_PER_MINUTE = 60_000_000_000
+
+def _value_kinds(s):
+    """Masks of string and pd.Timedelta elements in an object Series."""
+    inferred = pd.api.types.infer_dtype(s, skipna=True)
+    if inferred == "string":
+        return s.notna(), pd.Series(False, index=s.index)
+    if inferred == "timedelta":
+        return pd.Series(False, index=s.index), s.map(lambda v: isinstance(v, pd.Timedelta))
+    return s.map(lambda v: isinstance(v, str)), s.map(lambda v: isinstance(v, pd.Timedelta))
+
+def time_to_hours_series(series):
+    """Vectorized `time_to_hours`: strings/timedeltas/numbers to float hours (NaN where it returns None)."""
+    s = pd.Series(series)
+    if pd.api.types.is_timedelta64_dtype(s.dtype):
+        return s.dt.total_seconds() / 3600
+    if pd.api.types.is_numeric_dtype(s.dtype):
+        return s.astype("float64")
+    if pd.api.types.is_datetime64_any_dtype(s.dtype) or isinstance(s.dtype, pd.CategoricalDtype):
+        s = s.astype(object)
+    is_str, is_td = _value_kinds(s)
+    out = pd.Series(np.nan, index=s.index, dtype="float64")
+    if is_str.any():
+        out[is_str] = pd.to_timedelta(s[is_str], errors="coerce").dt.total_seconds() / 3600
+    if is_td.any():
+        out[is_td] = pd.to_timedelta(s[is_td]).dt.total_seconds() / 3600
+    rest = s.notna() & ~is_str & ~is_td
+    if rest.any():
+        # float(t) semantics: numbers and bools convert, anything else is missing
+        numeric = s[rest].map(lambda v: isinstance(v, (int, float, np.number)))
+        out[numeric[numeric].index] = s[numeric[numeric].index].astype("float64")
+    return out
+
+def format_timedelta_to_h_m_series(series):
+    """Vectorized `format_timedelta_to_h_m`: "HH:MM" labels (with "-" and "Invalid Format")
+    built with integer arithmetic on the whole column; None where the scalar returns None."""
+    s = pd.Series(series)
+    out = pd.Series([None] * len(s), index=s.index, dtype=object)
+    if pd.api.types.is_timedelta64_dtype(s.dtype):
+        td = s
+    else:
+        s = s.astype(object)
+        is_str, is_td = _value_kinds(s)
+        td = pd.Series(pd.NaT, index=s.index, dtype="timedelta64[ns]")
+        if is_td.any():
+            td[is_td] = pd.to_timedelta(s[is_td])
+        if is_str.any():
+            parsed = pd.to_timedelta(s[is_str], errors="coerce")
+            td[is_str] = parsed
+            # Strings that fail to parse: the scalar helper says "Invalid Format" only when
+            # to_timedelta raises ('' and 'NaT' parse to NaT and give None)
+            for idx in parsed.index[parsed.isna()]:
+                try:
+                    pd.to_timedelta(s[idx])
+                except ValueError:
+                    out[idx] = "Invalid Format"
+    valid = td.notna()
+    if valid.any():
+        ns = td[valid].astype("timedelta64[ns]").astype("int64")
+        abs_ns = ns.abs()
+        hours = (abs_ns // _NS_PER_HOUR).astype(str).str.zfill(2)
+        minutes = ((abs_ns % _NS_PER_HOUR) // _NS_PER_MINUTE).astype(str).str.zfill(2)
+        sign = pd.Series(np.where(ns < 0, "-", ""), index=ns.index)
+        out[valid] = (sign + hours + ":" + minutes).astype(object)
+    return out